@@ -1,9 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
+import io
+import csv
+import json
+import base64
+import functools
+import asyncio
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 
 from database import get_connection
 from auth import require_admin
+from deletion import deletions
+from profiler import profiler, watchdog, PROFILE_MAX_SECONDS, PROFILE_MIN_INTERVAL_MS
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -14,23 +25,143 @@ class UpdateUserBody(BaseModel):
     role: Optional[str] = None
 
 
+USERS_PAGE_MAX = 200
+USERS_COUNT_CAP = 10000  # Filtered counts stop here and are reported as "at least"
+
+EXPORT_BATCH = 500  # rows pulled from the server cursor per fetchmany
+EXPORT_NET_WRITE_TIMEOUT = 600  # seconds MySQL waits on a slow download before dropping it
+EXPORT_MAX_CONCURRENT = 4  # exports streaming at once, each holding a pool connection
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+# sort -> (key column, direction)
+USER_SORTS = {
+    "newest": ("created_at", "DESC"),
+    "oldest": ("created_at", "ASC"),
+    "username": ("username", "ASC"),
+}
+
+
+def _encode_cursor(row: dict, sort: str) -> str:
+    key = row["created_at"].isoformat() if sort != "username" else row["username"]
+    return base64.urlsafe_b64encode(json.dumps([key, row["id"]]).encode()).decode()
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        key, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort != "username":
+            key = datetime.fromisoformat(key)
+        return key, int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _user_json(r: dict) -> dict:
+    return {
+        "id": r["id"],
+        "username": r["username"],
+        "email": r["email"],
+        "role": r["role"],
+        "createdAt": r["created_at"].isoformat(),
+    }
+
+
+def _count_users(cursor, where: list[str], params: list) -> tuple[int, bool]:
+    """(count, exact). Unfiltered totals come from table statistics."""
+    if not where:
+        cursor.execute(
+            "SELECT TABLE_ROWS AS n FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users'"
+        )
+        row = cursor.fetchone()
+        estimate = int(row["n"] or 0) if row else 0
+        # Users waiting for the purge are few and found through idx_users_deleted
+        cursor.execute("SELECT COUNT(*) AS n FROM users WHERE deleted_at IS NOT NULL")
+        return max(estimate - cursor.fetchone()["n"], 0), False
+    cursor.execute(
+        f"SELECT COUNT(*) AS n FROM (SELECT 1 FROM users WHERE deleted_at IS NULL AND {' AND '.join(where)} LIMIT %s) t",
+        (*params, USERS_COUNT_CAP + 1),
+    )
+    n = cursor.fetchone()["n"]
+    return min(n, USERS_COUNT_CAP), n <= USERS_COUNT_CAP
+
+
 @router.get("/users")
-def list_users(admin: dict = Depends(require_admin)):
+def list_users(
+    limit: int = Query(50, ge=1, le=USERS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    sort: str = Query("newest", pattern="^(newest|oldest|username)$"),
+    role: Optional[str] = Query(None, pattern="^(user|admin)$"),
+    q: Optional[str] = Query(None, max_length=50),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    admin: dict = Depends(require_admin),
+):
+    """Keyset-paginated user list. Pass the returned `nextCursor` to get the next page."""
+    column, direction = USER_SORTS[sort]
+    where, params = [], []
+    if role:
+        where.append("role = %s")
+        params.append(role)
+    if q:
+        # Prefix match so the username index can be used
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where.append("username LIKE %s")
+        params.append(escaped + "%")
+    if created_from:
+        where.append("created_at >= %s")
+        params.append(created_from)
+    if created_to:
+        where.append("created_at <= %s")
+        params.append(created_to)
+
+    page_where, page_params = ["deleted_at IS NULL", *where], list(params)
+    if cursor:
+        key, last_id = _decode_cursor(cursor, sort)
+        op = "<" if direction == "DESC" else ">"
+        # Expanded form: MySQL does not use the index range for a row constructor
+        page_where.append(f"({column} {op} %s OR ({column} = %s AND id {op} %s))")
+        page_params += [key, key, last_id]
+
+    conn = get_connection()
+    db = conn.cursor(dictionary=True)
+    try:
+        db.execute(
+            f"SELECT id, username, email, role, created_at FROM users WHERE {' AND '.join(page_where)}"
+            + f" ORDER BY {column} {direction}, id {direction} LIMIT %s",
+            (*page_params, limit + 1),
+        )
+        rows = db.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        result = {
+            "users": [_user_json(r) for r in rows],
+            "nextCursor": _encode_cursor(rows[-1], sort) if has_more else None,
+        }
+        # Counting only on the first page keeps "load more" requests cheap
+        if not cursor:
+            total, exact = _count_users(db, where, params)
+            result["total"] = total
+            result["totalExact"] = exact
+        return result
+    finally:
+        db.close()
+        conn.close()
+
+
+@router.get("/users/{user_id}")
+def get_user(user_id: int, admin: dict = Depends(require_admin)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id, username, email, role, created_at FROM users ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        return [
-            {
-                "id": r["id"],
-                "username": r["username"],
-                "email": r["email"],
-                "role": r["role"],
-                "createdAt": r["created_at"].isoformat(),
-            }
-            for r in rows
-        ]
+        cursor.execute(
+            "SELECT id, username, email, role, created_at FROM users WHERE id = %s AND deleted_at IS NULL", (user_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        return _user_json(row)
     finally:
         cursor.close()
         conn.close()
@@ -41,30 +172,35 @@ def update_user(user_id: int, body: UpdateUserBody, admin: dict = Depends(requir
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
-        if not cursor.fetchone():
+        # One lookup for the target row and any username/email conflicts
+        # (comparisons done in SQL so they follow the column collation)
+        cursor.execute(
+            "SELECT id, role, deleted_at, username = %s AS username_taken, email = %s AS email_taken "
+            "FROM users WHERE id = %s OR username = %s OR email = %s",
+            (body.username, body.email, user_id, body.username, body.email),
+        )
+        rows = cursor.fetchall()
+        current = next((r for r in rows if r["id"] == user_id), None)
+        if not current or current["deleted_at"]:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        others = [r for r in rows if r["id"] != user_id]
 
         updates = []
         values = []
         if body.username is not None:
-            cursor.execute("SELECT id FROM users WHERE username = %s AND id != %s", (body.username, user_id))
-            if cursor.fetchone():
+            if any(r["username_taken"] for r in others):
                 raise HTTPException(status_code=409, detail="Ese nombre de usuario ya está en uso")
             updates.append("username = %s")
             values.append(body.username)
         if body.email is not None:
-            cursor.execute("SELECT id FROM users WHERE email = %s AND id != %s", (body.email, user_id))
-            if cursor.fetchone():
+            if any(r["email_taken"] for r in others):
                 raise HTTPException(status_code=409, detail="Ya existe una cuenta con ese email")
             updates.append("email = %s")
             values.append(body.email)
         if body.role is not None:
             if body.role not in ("user", "admin"):
                 raise HTTPException(status_code=400, detail="Rol inválido")
-            cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-            current = cursor.fetchone()
-            if current and current["role"] == "user":
+            if current["role"] == "user":
                 raise HTTPException(status_code=400, detail="No se puede cambiar el rol de un usuario regular")
             updates.append("role = %s")
             values.append(body.role)
@@ -142,21 +278,211 @@ def get_user_saved(user_id: int, admin: dict = Depends(require_admin)):
         conn.close()
 
 
-@router.delete("/users/{user_id}")
+# ── Exports ──
+
+SEARCH_LOG_EXPORT = {
+    "sql": "SELECT id, title, artist, album, spotify_url, youtube_url, score, created_at "
+           "FROM search_log WHERE user_id = %s ORDER BY id",
+    "columns": ("id", "title", "artist", "album", "spotifyUrl", "youtubeUrl", "score", "timestamp"),
+}
+SAVED_EXPORT = {
+    "sql": "SELECT id, title, artist, album, spotify_url, youtube_url, created_at "
+           "FROM search_history WHERE user_id = %s ORDER BY id",
+    "columns": ("id", "title", "artist", "album", "spotifyUrl", "youtubeUrl", "timestamp"),
+}
+
+_export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT)
+
+
+def _export_record(r: dict) -> dict:
+    record = {
+        "id": r["id"],
+        "title": r["title"],
+        "artist": r["artist"],
+        "album": r["album"],
+        "spotifyUrl": r["spotify_url"],
+        "youtubeUrl": r["youtube_url"],
+    }
+    if "score" in r:
+        record["score"] = r["score"]
+    record["timestamp"] = r["created_at"].isoformat()
+    return record
+
+
+def _require_user(user_id: int):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _open_export(spec: dict, user_id: int):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT,))
+        cursor.execute(spec["sql"], (user_id,))
+    except Exception:
+        _discard_export(conn, cursor)
+        raise
+    return conn, cursor
+
+
+def _close_export(conn, cursor):
+    cursor.close()
+    conn.close()
+
+
+def _discard_export(conn, cursor):
+    """Drop the session of an aborted export instead of reading the rest of it.
+
+    The pool reconnects a disconnected connection on its next checkout.
+    """
+    conn.disconnect()
+    for close in (cursor.close, conn.close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+def _discard_after(task: asyncio.Future, conn, cursor):
+    """Done-callback: discard the export connection once the thread using it returns."""
+    failed = task.cancelled() or task.exception() is not None
+    if conn is None:
+        if failed:
+            return  # _open_export already discarded it
+        conn, cursor = task.result()
+    _discard_export(conn, cursor)
+
+
+async def _stream_export(spec: dict, user_id: int, fmt: str):
+    """Yield the export in EXPORT_BATCH-row chunks from an unbuffered cursor.
+
+    Each fetchmany runs in a worker thread, so a slow query never blocks the
+    event loop, and memory stays constant whatever the row count. The
+    connection is held until the last chunk is sent; if the client goes away
+    mid-download the connection is disconnected rather than drained, after
+    any fetch still running in a thread has returned.
+    """
+    async with _export_slots:
+        conn = cursor = None
+        pending = None
+        finished = False
+        try:
+            # Shielded so a disconnect does not orphan the thread's result
+            pending = asyncio.ensure_future(asyncio.to_thread(_open_export, spec, user_id))
+            conn, cursor = await asyncio.shield(pending)
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=spec["columns"], lineterminator="\n")
+            if fmt == "csv":
+                writer.writeheader()
+            while True:
+                pending = asyncio.ensure_future(asyncio.to_thread(cursor.fetchmany, EXPORT_BATCH))
+                rows = await asyncio.shield(pending)
+                if not rows:
+                    break
+                for r in rows:
+                    if fmt == "csv":
+                        writer.writerow(_export_record(r))
+                    else:
+                        buffer.write(json.dumps(_export_record(r), ensure_ascii=False) + "\n")
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                yield chunk
+            finished = True
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            # No awaiting on the abort paths: it could be cut short by the cancellation
+            if finished:
+                await asyncio.to_thread(_close_export, conn, cursor)
+            elif pending is not None and not pending.done():
+                # A worker thread still has the connection; discard it when it returns
+                pending.add_done_callback(functools.partial(_discard_after, conn=conn, cursor=cursor))
+            elif conn is not None:
+                _discard_export(conn, cursor)
+
+
+async def _export_response(spec: dict, user_id: int, fmt: str, name: str) -> StreamingResponse:
+    if _export_slots.locked():
+        raise HTTPException(status_code=429, detail="Demasiadas exportaciones en curso")
+    await asyncio.to_thread(_require_user, user_id)
+    return StreamingResponse(
+        _stream_export(spec, user_id, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{user_id}.{fmt}"'},
+    )
+
+
+@router.get("/users/{user_id}/search-log/export")
+async def export_user_search_log(
+    user_id: int,
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    admin: dict = Depends(require_admin),
+):
+    return await _export_response(SEARCH_LOG_EXPORT, user_id, format, "search-log")
+
+
+@router.get("/users/{user_id}/saved/export")
+async def export_user_saved(
+    user_id: int,
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    admin: dict = Depends(require_admin),
+):
+    return await _export_response(SAVED_EXPORT, user_id, format, "saved")
+
+
+@router.delete("/users/{user_id}", status_code=202)
 def delete_user(user_id: int, admin: dict = Depends(require_admin)):
+    """Soft-delete now; the user's rows are purged in the background (see deletion.py)."""
     if user_id == admin["id"]:
         raise HTTPException(status_code=400, detail="No puedes eliminarte a ti mismo")
 
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+        cursor.execute("SELECT id FROM users WHERE id = %s AND deleted_at IS NULL", (user_id,))
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        deletions.soft_delete(cursor, [user_id])
         conn.commit()
-        return {"message": "Usuario eliminado"}
     finally:
         cursor.close()
         conn.close()
+    deletions.start([user_id])
+    return {"message": "Usuario eliminado", "deletion": deletions.progress(user_id)}
+
+
+# ── Diagnostics ──
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_process(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10, ge=PROFILE_MIN_INTERVAL_MS, le=1000),
+    admin: dict = Depends(require_admin),
+):
+    """Sample every thread for `seconds` and return collapsed stacks for a flamegraph."""
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="Ya hay un perfil en curso")
+    try:
+        stacks, samples = await asyncio.to_thread(profiler.run, seconds, interval_ms)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="Ya hay un perfil en curso")
+    return PlainTextResponse(stacks, headers={"X-Profile-Samples": str(samples)})
+
+
+@router.get("/profile/status")
+def profile_status(admin: dict = Depends(require_admin)):
+    return {
+        "running": profiler.running,
+        "loopBlockThresholdMs": int(watchdog.threshold * 1000),
+        "loopBlockedEpisodes": watchdog.blocked_episodes,
+    }
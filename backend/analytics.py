@@ -0,0 +1,238 @@
+import os
+import asyncio
+
+from fastapi import APIRouter, Depends, Query
+from dotenv import load_dotenv
+
+from database import get_connection
+from auth import require_admin
+
+load_dotenv()
+
+router = APIRouter(prefix="/admin/analytics", tags=["analytics"])
+
+ROLLUP_INTERVAL = int(os.getenv("ROLLUP_INTERVAL", "60"))  # seconds
+ROLLUP_BATCH = 50000  # search_log ids folded per transaction
+ROLLUP_NAME = "search_log"
+
+
+def _rollup_range(cursor, low: int, high: int):
+    """Fold search_log rows with low < id <= high into the rollup tables."""
+    cursor.execute(
+        "INSERT INTO search_volume_hourly (hour, searches, score_sum) "
+        "SELECT DATE(created_at) + INTERVAL HOUR(created_at) HOUR, COUNT(*), COALESCE(SUM(score), 0) "
+        "FROM search_log WHERE id > %s AND id <= %s GROUP BY 1 "
+        "ON DUPLICATE KEY UPDATE searches = searches + VALUES(searches), score_sum = score_sum + VALUES(score_sum)",
+        (low, high),
+    )
+    cursor.execute(
+        "INSERT INTO search_song_daily (day, title, artist, searches, score_sum) "
+        "SELECT DATE(created_at), title, artist, COUNT(*), COALESCE(SUM(score), 0) "
+        "FROM search_log WHERE id > %s AND id <= %s GROUP BY 1, 2, 3 "
+        "ON DUPLICATE KEY UPDATE searches = searches + VALUES(searches), score_sum = score_sum + VALUES(score_sum)",
+        (low, high),
+    )
+    cursor.execute(
+        "INSERT INTO search_user_daily (day, user_id, searches) "
+        "SELECT DATE(created_at), user_id, COUNT(*) "
+        "FROM search_log WHERE id > %s AND id <= %s GROUP BY 1, 2 "
+        "ON DUPLICATE KEY UPDATE searches = searches + VALUES(searches)",
+        (low, high),
+    )
+
+
+class RollupJob:
+    """Incrementally aggregates search_log into hourly/daily tables.
+
+    Progress is the last folded search_log id, stored in rollup_state and
+    advanced in the same transaction as the aggregates, so a crash never
+    counts a row twice. The row lock on rollup_state keeps several workers
+    from folding the same range. Each tick only goes up to the highest id
+    seen on the previous tick, leaving in-flight inserts with lower ids time
+    to commit before their range is read.
+    """
+
+    def __init__(self):
+        self._safe_max = 0
+        self.last_id = 0
+
+    def run_once(self) -> int:
+        """Fold everything up to the safe high-water mark; returns rows folded."""
+        folded = 0
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM search_log")
+            newest = cursor.fetchone()[0]
+            safe_max, self._safe_max = self._safe_max, newest
+            conn.commit()
+            while True:
+                cursor.execute(
+                    "INSERT IGNORE INTO rollup_state (name, last_id) VALUES (%s, 0)", (ROLLUP_NAME,)
+                )
+                cursor.execute("SELECT last_id FROM rollup_state WHERE name = %s FOR UPDATE", (ROLLUP_NAME,))
+                low = cursor.fetchone()[0]
+                high = min(safe_max, low + ROLLUP_BATCH)
+                if high <= low:
+                    conn.rollback()
+                    self.last_id = low
+                    return folded
+                _rollup_range(cursor, low, high)
+                cursor.execute("UPDATE rollup_state SET last_id = %s WHERE name = %s", (high, ROLLUP_NAME))
+                conn.commit()
+                folded += high - low
+                self.last_id = high
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    async def run_forever(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                pass
+            await asyncio.sleep(ROLLUP_INTERVAL)
+
+
+rollups = RollupJob()
+
+
+# ── Endpoints (read the rollups only) ──
+
+@router.get("/top-songs")
+def top_songs(
+    days: int = Query(30, ge=1, le=3650),
+    limit: int = Query(20, ge=1, le=100),
+    admin: dict = Depends(require_admin),
+):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT title, artist, SUM(searches) AS searches, SUM(score_sum) / SUM(searches) AS avg_score "
+            "FROM search_song_daily WHERE day >= CURDATE() - INTERVAL %s DAY "
+            "GROUP BY title, artist ORDER BY searches DESC LIMIT %s",
+            (days, limit),
+        )
+        return [
+            {
+                "title": r["title"],
+                "artist": r["artist"],
+                "searches": int(r["searches"]),
+                "avgScore": round(float(r["avg_score"] or 0), 1),
+            }
+            for r in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/volume")
+def search_volume(
+    days: int = Query(30, ge=1, le=3650),
+    admin: dict = Depends(require_admin),
+):
+    """Recognition volume and average ACR score per day."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT DATE(hour) AS day, SUM(searches) AS searches, SUM(score_sum) AS score_sum "
+            "FROM search_volume_hourly WHERE hour >= CURDATE() - INTERVAL %s DAY "
+            "GROUP BY DATE(hour) ORDER BY day",
+            (days,),
+        )
+        rows = cursor.fetchall()
+        total = sum(int(r["searches"]) for r in rows)
+        score_sum = sum(float(r["score_sum"]) for r in rows)
+        return {
+            "days": [
+                {
+                    "day": r["day"].isoformat(),
+                    "searches": int(r["searches"]),
+                    "avgScore": round(float(r["score_sum"]) / int(r["searches"]), 1) if r["searches"] else None,
+                }
+                for r in rows
+            ],
+            "totalSearches": total,
+            "avgScore": round(score_sum / total, 1) if total else None,
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/hourly")
+def search_volume_hourly(
+    hours: int = Query(48, ge=1, le=24 * 31),
+    admin: dict = Depends(require_admin),
+):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT hour, searches, score_sum FROM search_volume_hourly "
+            "WHERE hour >= NOW() - INTERVAL %s HOUR ORDER BY hour",
+            (hours,),
+        )
+        return [
+            {
+                "hour": r["hour"].isoformat(),
+                "searches": r["searches"],
+                "avgScore": round(r["score_sum"] / r["searches"], 1) if r["searches"] else None,
+            }
+            for r in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/top-searchers")
+def top_searchers(
+    days: int = Query(30, ge=1, le=3650),
+    limit: int = Query(20, ge=1, le=100),
+    admin: dict = Depends(require_admin),
+):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT d.user_id, u.username, u.avatar, d.searches FROM ("
+            "  SELECT user_id, SUM(searches) AS searches FROM search_user_daily "
+            "  WHERE day >= CURDATE() - INTERVAL %s DAY GROUP BY user_id ORDER BY searches DESC LIMIT %s"
+            ") d JOIN users u ON u.id = d.user_id AND u.deleted_at IS NULL ORDER BY d.searches DESC",
+            (days, limit),
+        )
+        return [
+            {"id": r["user_id"], "username": r["username"], "avatar": r["avatar"], "searches": int(r["searches"])}
+            for r in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/status")
+def rollup_status(admin: dict = Depends(require_admin)):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT last_id, updated_at FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+        state = cursor.fetchone()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM search_log")
+        max_id = cursor.fetchone()["max_id"]
+        last_id = state["last_id"] if state else 0
+        return {
+            "lastId": last_id,
+            "pendingRows": max(0, max_id - last_id),
+            "updatedAt": state["updated_at"].isoformat() if state and state["updated_at"] else None,
+        }
+    finally:
+        cursor.close()
+        conn.close()
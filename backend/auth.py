@@ -19,6 +19,26 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Ids of soft-deleted accounts. JWTs are not stored, so tokens issued before
+# a deletion stay valid until they expire unless checked against this set.
+deleted_user_ids: set[int] = set()
+
+
+def load_deleted_users():
+    """Seed deleted_user_ids with the deletions still being purged."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM users WHERE deleted_at IS NOT NULL")
+        deleted_user_ids.update(r[0] for r in cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def revoke_user(user_id: int):
+    deleted_user_ids.add(user_id)
+
 
 class GoogleAuthBody(BaseModel):
     credential: str
@@ -39,6 +59,17 @@ def create_token(user_id: int, username: str, role: str = "user") -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+def decode_token(token: str) -> dict | None:
+    """Decode a JWT into the user dict, or None if it is invalid or expired."""
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return None
+    if payload["sub"] in deleted_user_ids:
+        return None
+    return {"id": payload["sub"], "username": payload["username"], "role": payload.get("role", "user")}
+
+
 def get_current_user(request: Request) -> dict:
     auth_header = request.headers.get("Authorization", "")
     if not auth_header.startswith("Bearer "):
@@ -46,11 +77,13 @@ def get_current_user(request: Request) -> dict:
     token = auth_header[7:]
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return {"id": payload["sub"], "username": payload["username"], "role": payload.get("role", "user")}
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Token inválido")
+    if payload["sub"] in deleted_user_ids:
+        raise HTTPException(status_code=401, detail="Cuenta eliminada")
+    return {"id": payload["sub"], "username": payload["username"], "role": payload.get("role", "user")}
 
 
 def require_admin(user: dict = Depends(get_current_user)) -> dict:
@@ -89,18 +122,22 @@ def google_auth(body: GoogleAuthBody):
     try:
         # Try to find user by google_id
         cursor.execute(
-            "SELECT id, username, email, role, avatar, google_id FROM users WHERE google_id = %s",
+            "SELECT id, username, email, role, avatar, google_id, deleted_at FROM users WHERE google_id = %s",
             (google_id,),
         )
         user = cursor.fetchone()
+        if user and user["deleted_at"]:
+            raise HTTPException(status_code=403, detail="Esta cuenta está siendo eliminada")
 
         if not user:
             # Try to find by email (link existing account or admin placeholder)
             cursor.execute(
-                "SELECT id, username, email, role, avatar, google_id FROM users WHERE email = %s",
+                "SELECT id, username, email, role, avatar, google_id, deleted_at FROM users WHERE email = %s",
                 (email,),
             )
             user = cursor.fetchone()
+            if user and user["deleted_at"]:
+                raise HTTPException(status_code=403, detail="Esta cuenta está siendo eliminada")
 
             if user:
                 # Link Google account to existing user
@@ -147,7 +184,10 @@ def me(user: dict = Depends(get_current_user)):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id, username, email, role, avatar, created_at FROM users WHERE id = %s", (user["id"],))
+        cursor.execute(
+            "SELECT id, username, email, role, avatar, created_at FROM users WHERE id = %s AND deleted_at IS NULL",
+            (user["id"],),
+        )
         row = cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
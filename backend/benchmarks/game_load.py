@@ -0,0 +1,329 @@
+"""Load test for the multiplayer game WebSocket.
+
+`serve` runs the game router in a standalone app with a few extra
+/loadtest endpoints: rooms are created directly in the registry (no
+friendship checks) and the server reports RSS, CPU time, event-loop lag and
+WebSocket counters. `run` mints JWTs with auth.create_token, connects every
+player of every room, and plays rounds through start, stop, keep_listening,
+give_up and next_round, timing how long each broadcast takes to reach all
+players of the room.
+
+Deezer is replaced by benchmarks/stub_deezer.py. Importing the backend
+modules still opens the MySQL pool, so the usual .env must point at a
+reachable database (the game path itself does not query it).
+
+    cd backend
+    python -m benchmarks.stub_deezer --port 8765 &
+    DEEZER_API_URL=http://127.0.0.1:8765 python -m benchmarks.game_load serve --port 8100 &
+    python -m benchmarks.game_load run --url http://127.0.0.1:8100 --rooms 500 --players 8 --rounds 5 --workers 4
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import tempfile
+import multiprocessing
+
+import httpx
+
+import protocol
+
+LAG_PROBE_INTERVAL = 0.05  # seconds
+BROADCAST_TIMEOUT = 30  # seconds to wait for a broadcast to reach a whole room
+LOAD_USER_ID_BASE = 1_000_000  # Synthetic user ids, far from real ones
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0, "p50": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {"n": len(ordered), "p50": round(pick(0.50), 3), "p99": round(pick(0.99), 3), "max": round(ordered[-1], 3)}
+
+
+# ── Server side ──
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoopLagProbe:
+    """Measures how late a periodic sleep wakes up, i.e. event-loop blocking."""
+
+    def __init__(self, interval: float = LAG_PROBE_INTERVAL):
+        self.interval = interval
+        self.samples: list[float] = []
+
+    async def run_forever(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append((time.perf_counter() - started - self.interval) * 1000)
+
+    def summary(self, reset: bool = False) -> dict:
+        result = percentiles(self.samples)
+        if reset:
+            self.samples = []
+        return result
+
+
+def serve(args):
+    os.environ.setdefault("PREVIEW_CACHE_DIR", tempfile.mkdtemp(prefix="oido_load_previews_"))
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    import game
+    from supervisor import stats as connection_stats
+
+    app = FastAPI()
+    app.include_router(game.router)
+    probe = LoopLagProbe()
+    next_user_id = itertools.count(LOAD_USER_ID_BASE)
+
+    @app.on_event("startup")
+    async def start_probe():
+        asyncio.create_task(probe.run_forever())
+
+    @app.post("/loadtest/rooms")
+    async def create_rooms(count: int, players: int):
+        layout = []
+        for _ in range(count):
+            user_ids = [next(next_user_id) for _ in range(players)]
+            room_id = f"load{user_ids[0]}"
+            game.rooms.add(game.RoomState(room_id, user_ids[0], f"load_{user_ids[0]}", set(user_ids[1:])))
+            layout.append({"roomId": room_id, "userIds": user_ids})
+        return layout
+
+    @app.get("/loadtest/stats")
+    async def load_stats(reset: bool = False):
+        return {
+            "rooms": len(game.rooms),
+            "rssBytes": _rss_bytes(),
+            "cpuSeconds": time.process_time(),
+            "loopLagMs": probe.summary(reset),
+            "connections": connection_stats.as_dict(),
+            "rounds": game.round_stats.as_dict(),
+        }
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+# ── Client side ──
+
+_TYPES_BY_OPCODE = {op: t for t, (op, _) in protocol.MESSAGES.items()}
+_TYPES_BY_OPCODE[protocol.OP_PLAYERS] = "players"
+
+
+def _message_type(data) -> str | None:
+    if isinstance(data, list):
+        return _TYPES_BY_OPCODE.get(data[0])
+    return data.get("type")
+
+
+class RoomDriver:
+    """Plays one room: every action waits until its broadcast reached all players."""
+
+    def __init__(self, room: dict, tokens: dict, ws_url: str, compact: bool):
+        self.room = room
+        self.tokens = tokens
+        self.ws_url = ws_url
+        self.compact = compact
+        self.sockets: dict[int, object] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.received = 0
+        self._expected: str | None = None
+        self._sent_at = 0.0
+        self._pending = 0
+        self._done: asyncio.Future | None = None
+        self._readers: list[asyncio.Task] = []
+
+    async def connect(self, limiter: asyncio.Semaphore):
+        import websockets
+
+        for uid in self.room["userIds"]:
+            url = f"{self.ws_url}/game/ws/{self.room['roomId']}?token={self.tokens[str(uid)]}"
+            if self.compact:
+                url += "&proto=compact"
+            async with limiter:
+                ws = await websockets.connect(url, max_size=None, open_timeout=60)
+            self.sockets[uid] = ws
+            self._readers.append(asyncio.create_task(self._read(ws)))
+
+    async def _read(self, ws):
+        try:
+            async for raw in ws:
+                data = json.loads(raw)
+                msg_type = _message_type(data)
+                self.received += 1
+                if msg_type == "ping":
+                    await ws.send(json.dumps({"type": "pong"}))
+                elif msg_type == self._expected and self._done and not self._done.done():
+                    self.latencies.setdefault(msg_type, []).append((time.perf_counter() - self._sent_at) * 1000)
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._done.set_result(None)
+        except Exception:
+            pass
+
+    async def expect(self, msg_type: str, user_id: int, action: dict):
+        self._expected = msg_type
+        self._pending = len(self.sockets)
+        self._done = asyncio.get_running_loop().create_future()
+        self._sent_at = time.perf_counter()
+        await self.sockets[user_id].send(json.dumps(action))
+        await asyncio.wait_for(self._done, BROADCAST_TIMEOUT)
+
+    async def play(self, rounds: int, genre_id: int):
+        ids = self.room["userIds"]
+        creator, first, second = ids[0], ids[-1], ids[-2]
+        for r in range(rounds):
+            if r == 0:
+                await self.expect("game_start", creator, {"type": "start", "genres": [genre_id]})
+            else:
+                await self.expect("game_start", creator, {"type": "next_round"})
+            await self.expect("player_stopped", first, {"type": "stop"})
+            await self.expect("keep_listening", first, {"type": "keep_listening"})
+            await self.expect("player_stopped", second, {"type": "stop"})
+            await self.expect("round_lost", second, {"type": "give_up"})
+
+    async def close(self):
+        for ws in self.sockets.values():
+            try:
+                await ws.close()
+            except Exception:
+                pass
+        for task in self._readers:
+            task.cancel()
+
+
+async def _drive(rooms: list[dict], tokens: dict, args, barrier) -> dict:
+    limiter = asyncio.Semaphore(args.connect_concurrency)
+    drivers = [RoomDriver(room, tokens, args.ws_url, args.compact) for room in rooms]
+    errors = []
+
+    results = await asyncio.gather(*(d.connect(limiter) for d in drivers), return_exceptions=True)
+    errors += [repr(e) for e in results if isinstance(e, BaseException)]
+    await asyncio.to_thread(barrier.wait)  # all connected: parent samples idle memory
+
+    results = await asyncio.gather(*(d.play(args.rounds, args.genre) for d in drivers), return_exceptions=True)
+    errors += [repr(e) for e in results if isinstance(e, BaseException)]
+    await asyncio.to_thread(barrier.wait)  # all played: parent samples lag and CPU
+
+    await asyncio.gather(*(d.close() for d in drivers))
+    latencies: dict[str, list[float]] = {}
+    for d in drivers:
+        for msg_type, values in d.latencies.items():
+            latencies.setdefault(msg_type, []).extend(values)
+    return {"latencies": latencies, "received": sum(d.received for d in drivers), "errors": errors}
+
+
+def _worker(rooms, tokens, args, barrier, results):
+    results.put(asyncio.run(_drive(rooms, tokens, args, barrier)))
+
+
+def run(args):
+    from auth import create_token
+
+    args.ws_url = args.url.replace("http", "ws", 1)
+    with httpx.Client(base_url=args.url, timeout=60) as client:
+        before = client.get("/loadtest/stats", params={"reset": True}).json()
+        layout = client.post("/loadtest/rooms", params={"count": args.rooms, "players": args.players}).json()
+        tokens = {str(uid): create_token(uid, f"load_{uid}") for room in layout for uid in room["userIds"]}
+
+        workers = max(1, min(args.workers, len(layout)))
+        barrier = multiprocessing.Barrier(workers + 1)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_worker, args=(layout[i::workers], tokens, args, barrier, results))
+            for i in range(workers)
+        ]
+        for p in procs:
+            p.start()
+
+        barrier.wait()
+        connected = client.get("/loadtest/stats", params={"reset": True}).json()
+        started = time.perf_counter()
+        barrier.wait()
+        duration = time.perf_counter() - started
+        played = client.get("/loadtest/stats").json()
+
+        outcomes = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    latencies: dict[str, list[float]] = {}
+    for outcome in outcomes:
+        for msg_type, values in outcome["latencies"].items():
+            latencies.setdefault(msg_type, []).extend(values)
+    every = [v for values in latencies.values() for v in values]
+    errors = [e for outcome in outcomes for e in outcome["errors"]]
+
+    cpu = played["cpuSeconds"] - connected["cpuSeconds"]
+    msgs_in = played["connections"]["messagesIn"] - connected["connections"]["messagesIn"]
+    msgs_out = played["connections"]["messagesOut"] - connected["connections"]["messagesOut"]
+    report = {
+        "rooms": args.rooms,
+        "playersPerRoom": args.players,
+        "clients": args.rooms * args.players,
+        "rounds": args.rounds,
+        "compact": args.compact,
+        "playSeconds": round(duration, 3),
+        "broadcastLatencyMs": {"all": percentiles(every), **{t: percentiles(v) for t, v in latencies.items()}},
+        "serverLoopLagMs": played["loopLagMs"],
+        "memoryPerRoomBytes": {
+            "connected": (connected["rssBytes"] - before["rssBytes"]) // max(1, args.rooms),
+            "afterPlay": (played["rssBytes"] - before["rssBytes"]) // max(1, args.rooms),
+        },
+        "cpuPerMessageUs": {
+            "in": round(cpu / msgs_in * 1e6, 2) if msgs_in else None,
+            "out": round(cpu / msgs_out * 1e6, 2) if msgs_out else None,
+        },
+        "serverMessages": {"in": msgs_in, "out": msgs_out},
+        "clientMessagesReceived": sum(o["received"] for o in outcomes),
+        "errors": len(errors),
+        "firstErrors": errors[:5],
+    }
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="Run the game server with load-test endpoints")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8100)
+
+    p_run = sub.add_parser("run", help="Drive simulated players against a `serve` instance")
+    p_run.add_argument("--url", default="http://127.0.0.1:8100")
+    p_run.add_argument("--rooms", type=int, default=100)
+    p_run.add_argument("--players", type=int, default=8)
+    p_run.add_argument("--rounds", type=int, default=5)
+    p_run.add_argument("--genre", type=int, default=132)
+    p_run.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Client processes")
+    p_run.add_argument("--connect-concurrency", type=int, default=200, help="Handshakes in flight per worker")
+    p_run.add_argument("--compact", action="store_true", help="Use the compact wire protocol")
+
+    args = parser.parse_args()
+    if args.command == "run" and args.players < 2:
+        parser.error("--players must be at least 2")
+    if args.command == "serve":
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""End-to-end HTTP benchmark for the main API endpoints.
+
+`seed` fills a MySQL database (use a dedicated DB_NAME) with benchmark users,
+friendships, saved songs and search log rows. `run` boots `main:app` under
+uvicorn next to the ACRCloud and Deezer stand-ins in this package, drives
+each scenario at the requested concurrency and prints one JSON document with
+throughput, latency percentiles, status codes and the number of SQL
+statements the server executed per request (MySQL's `Questions` counter,
+so run it against a database nobody else is using).
+
+    cd backend
+    DB_NAME=oido_bench python -m benchmarks.http_bench seed --users 2000
+    DB_NAME=oido_bench python -m benchmarks.http_bench run --requests 2000 --concurrency 32 > bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import httpx
+
+from benchmarks.game_load import percentiles
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SEED_PREFIX = "bench_user_"
+SEED_ADMIN = "bench_admin"
+SEED_BATCH = 1000
+SCENARIOS = ["recognize", "history", "social_search", "social_user", "admin_users", "game_song"]
+# 1 KiB of fake audio; the stub ACRCloud never decodes it
+FAKE_AUDIO = bytes(1024)
+
+
+# ── Seeding ──
+
+def _insert_many(cursor, sql: str, rows: list[tuple]):
+    for i in range(0, len(rows), SEED_BATCH):
+        cursor.executemany(sql, rows[i:i + SEED_BATCH])
+
+
+def seed(args):
+    from database import init_db, get_connection
+
+    init_db()
+    rng = random.Random(args.seed)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE username LIKE %s OR username = %s", (SEED_PREFIX + "%", SEED_ADMIN))
+        _insert_many(
+            cursor,
+            "INSERT INTO users (username, email, role) VALUES (%s, %s, %s)",
+            [(SEED_ADMIN, f"{SEED_ADMIN}@bench.local", "admin")]
+            + [(f"{SEED_PREFIX}{i}", f"{SEED_PREFIX}{i}@bench.local", "user") for i in range(args.users)],
+        )
+        conn.commit()
+        cursor.execute("SELECT id FROM users WHERE username LIKE %s ORDER BY id", (SEED_PREFIX + "%",))
+        ids = [r[0] for r in cursor.fetchall()]
+
+        friendships = set()
+        for uid in ids:
+            for other in rng.sample(ids, min(args.friends, len(ids))):
+                if other != uid and (other, uid) not in friendships:
+                    friendships.add((uid, other))
+        _insert_many(
+            cursor,
+            "INSERT INTO friendships (sender_id, receiver_id, status) VALUES (%s, %s, 'accepted')",
+            sorted(friendships),
+        )
+
+        songs = [(f"Cancion {n}", f"Artista {n % 97}", f"Album {n % 31}") for n in range(500)]
+        history_rows, log_rows = [], []
+        for uid in ids:
+            for title, artist, album in rng.sample(songs, args.history):
+                history_rows.append((uid, title, artist, album))
+            for _ in range(args.searches):
+                title, artist, album = rng.choice(songs)
+                log_rows.append((uid, title, artist, album, round(rng.uniform(50, 100), 1)))
+        _insert_many(
+            cursor,
+            "INSERT INTO search_history (user_id, title, artist, album) VALUES (%s, %s, %s, %s)",
+            history_rows,
+        )
+        _insert_many(
+            cursor,
+            "INSERT INTO search_log (user_id, title, artist, album, score) VALUES (%s, %s, %s, %s, %s)",
+            log_rows,
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    print(json.dumps({
+        "users": len(ids),
+        "friendships": len(friendships),
+        "searchHistory": len(history_rows),
+        "searchLog": len(log_rows),
+    }))
+
+
+# ── Running ──
+
+def _seeded_users() -> tuple[list[dict], dict]:
+    from database import get_connection
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT id, username, role FROM users WHERE username LIKE %s OR username = %s",
+            (SEED_PREFIX + "%", SEED_ADMIN),
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    users = [r for r in rows if r["role"] != "admin"]
+    admins = [r for r in rows if r["role"] == "admin"]
+    if not users or not admins:
+        sys.exit("No seeded users found: run `python -m benchmarks.http_bench seed` first")
+    return users, admins[0]
+
+
+def _query_count() -> int:
+    from database import get_connection
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        return int(cursor.fetchone()[1])
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _spawn(module_args: list[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *module_args], cwd=BACKEND_DIR, env=env)
+
+
+def _wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _request_factory(name: str, users: list[dict], admin: dict, tokens: dict, rng: random.Random):
+    """Returns a coroutine function issuing one request of the scenario."""
+
+    def auth(uid):
+        return {"Authorization": f"Bearer {tokens[uid]}"}
+
+    async def recognize(client):
+        u = rng.choice(users)
+        files = {"audio": ("sample.webm", FAKE_AUDIO, "audio/webm")}
+        return await client.post("/recognize", files=files, headers=auth(u["id"]))
+
+    async def history(client):
+        return await client.get("/history", headers=auth(rng.choice(users)["id"]))
+
+    async def social_search(client):
+        q = f"{SEED_PREFIX}{rng.randrange(100)}"
+        return await client.get("/social/search", params={"q": q}, headers=auth(rng.choice(users)["id"]))
+
+    async def social_user(client):
+        target = rng.choice(users)["id"]
+        return await client.get(f"/social/users/{target}", headers=auth(rng.choice(users)["id"]))
+
+    async def admin_users(client):
+        return await client.get("/admin/users", headers=auth(admin["id"]))
+
+    async def game_song(client):
+        return await client.get("/game/song", params={"genre_id": 132}, headers=auth(rng.choice(users)["id"]))
+
+    return {
+        "recognize": recognize,
+        "history": history,
+        "social_search": social_search,
+        "social_user": social_user,
+        "admin_users": admin_users,
+        "game_song": game_song,
+    }[name]
+
+
+async def _run_scenario(client: httpx.AsyncClient, request, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                resp = await request(client)
+                status = str(resp.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughputRps": round(total / elapsed, 2),
+        "latencyMs": percentiles(latencies),
+        "statuses": statuses,
+    }
+
+
+async def _drive(args, users, admin, tokens) -> dict:
+    rng = random.Random(args.seed)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        for name in args.scenarios:
+            request = _request_factory(name, users, admin, tokens, rng)
+            # Warm caches (Deezer charts, pool connections) outside the measurement
+            await _run_scenario(client, request, min(args.concurrency, args.requests), args.concurrency)
+            before = await asyncio.to_thread(_query_count)
+            results[name] = await _run_scenario(client, request, args.requests, args.concurrency)
+            # The SHOW STATUS itself counts as one statement
+            queries = await asyncio.to_thread(_query_count) - before - 1
+            results[name]["dbQueries"] = queries
+            results[name]["dbQueriesPerRequest"] = round(queries / args.requests, 2)
+    return results
+
+
+def run(args):
+    from auth import create_token
+
+    users, admin = _seeded_users()
+    tokens = {u["id"]: create_token(u["id"], u["username"], u["role"]) for u in [*users, admin]}
+
+    procs = []
+    if not args.url:
+        env = {
+            **os.environ,
+            "DEEZER_API_URL": f"http://127.0.0.1:{args.deezer_port}",
+            "ACR_BASE_URL": f"http://127.0.0.1:{args.acr_port}",
+            "PREVIEW_CACHE_DIR": tempfile.mkdtemp(prefix="oido_bench_previews_"),
+        }
+        procs.append(_spawn(["benchmarks.stub_deezer", "--port", str(args.deezer_port)], env))
+        procs.append(_spawn(
+            ["benchmarks.stub_acrcloud", "--port", str(args.acr_port), "--delay-ms", str(args.acr_delay_ms)], env
+        ))
+        procs.append(_spawn(
+            ["uvicorn", "main:app", "--port", str(args.app_port), "--workers", str(args.app_workers),
+             "--log-level", "warning"],
+            env,
+        ))
+        args.url = f"http://127.0.0.1:{args.app_port}"
+    try:
+        _wait_ready(f"{args.url}/health")
+        results = asyncio.run(_drive(args, users, admin, tokens))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+    print(json.dumps({
+        "url": args.url,
+        "seededUsers": len(users),
+        "requestsPerScenario": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="Create benchmark users and their data")
+    p_seed.add_argument("--users", type=int, default=1000)
+    p_seed.add_argument("--friends", type=int, default=20, help="Friends per user (approximate)")
+    p_seed.add_argument("--history", type=int, default=30, help="Saved songs per user")
+    p_seed.add_argument("--searches", type=int, default=100, help="search_log rows per user")
+    p_seed.add_argument("--seed", type=int, default=1)
+
+    p_run = sub.add_parser("run", help="Boot the app and drive the scenarios")
+    p_run.add_argument("--url", help="Benchmark an already running server instead of booting one")
+    p_run.add_argument("--app-port", type=int, default=8200)
+    p_run.add_argument("--app-workers", type=int, default=1)
+    p_run.add_argument("--deezer-port", type=int, default=8765)
+    p_run.add_argument("--acr-port", type=int, default=8766)
+    p_run.add_argument("--acr-delay-ms", type=int, default=0)
+    p_run.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    p_run.add_argument("--concurrency", type=int, default=16)
+    p_run.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    p_run.add_argument("--seed", type=int, default=1)
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Bytes per round on the game WebSocket: JSON vs compact protocol.
+
+Replays the messages of a typical round (player list updates, game_start,
+a stop, keep listening, a second stop, round_won, next round) for one
+receiving player and reports raw and permessage-deflate sizes.
+
+    cd backend && python -m benchmarks.protocol_bytes --players 8 --rounds 10
+"""
+
+import argparse
+import json
+import zlib
+
+import protocol
+
+
+def round_messages(players: list[dict], round_no: int) -> list[dict]:
+    msgs = []
+    for p in players:
+        p["canStop"] = True
+    msgs.append({"type": "players", "players": [dict(p) for p in players]})
+    msgs.append({
+        "type": "game_start",
+        "previewUrl": f"/game/preview/{3135556 + round_no}",
+    })
+    first, second = players[round_no % len(players)], players[(round_no + 1) % len(players)]
+    msgs.append({"type": "player_stopped", "userId": first["id"], "username": first["username"]})
+    msgs.append({"type": "keep_listening", "userId": first["id"], "username": first["username"]})
+    first["canStop"] = False
+    msgs.append({"type": "players", "players": [dict(p) for p in players]})
+    msgs.append({"type": "player_stopped", "userId": second["id"], "username": second["username"]})
+    second["score"] += 1
+    scores = sorted(
+        ({"id": p["id"], "username": p["username"], "score": p["score"]} for p in players),
+        key=lambda x: x["score"],
+        reverse=True,
+    )
+    msgs.append({
+        "type": "round_won",
+        "song": {
+            "title": "Cancion de prueba",
+            "artist": "Artista de prueba",
+            "album": "Album de prueba",
+            "cover": "https://e-cdns-images.dzcdn.net/images/cover/0123456789abcdef/500x500-000000-80-0-0.jpg",
+        },
+        "winnerId": second["id"],
+        "winnerName": second["username"],
+        "scores": scores,
+    })
+    msgs.append({"type": "players", "players": [dict(p) for p in players]})
+    return msgs
+
+
+def measure(n_players: int, n_rounds: int) -> dict:
+    players = [
+        {"id": 100 + i, "username": f"jugador_{i}", "isCreator": i == 0, "score": 0, "canStop": True, "connected": True}
+        for i in range(n_players)
+    ]
+    delta = protocol.PlayerListDelta()
+    deflate_json = zlib.compressobj(wbits=-15)
+    deflate_compact = zlib.compressobj(wbits=-15)
+    totals = {"json": 0, "compact": 0, "json_deflate": 0, "compact_deflate": 0, "messages": 0}
+
+    for r in range(n_rounds):
+        for msg in round_messages(players, r):
+            as_json = protocol.dumps(msg)
+            if msg["type"] == "players":
+                as_compact = protocol.dumps(delta.encode(msg["players"]))
+            else:
+                as_compact = protocol.dumps(protocol.encode(msg))
+            totals["messages"] += 1
+            totals["json"] += len(as_json.encode())
+            totals["compact"] += len(as_compact.encode())
+            # permessage-deflate with context takeover, as negotiated by browsers and uvicorn
+            totals["json_deflate"] += len(deflate_json.compress(as_json.encode()) + deflate_json.flush(zlib.Z_SYNC_FLUSH)) - 4
+            totals["compact_deflate"] += len(deflate_compact.compress(as_compact.encode()) + deflate_compact.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+    per_round = {k: v / n_rounds for k, v in totals.items() if k != "messages"}
+    return {
+        "players": n_players,
+        "rounds": n_rounds,
+        "messagesPerRound": totals["messages"] / n_rounds,
+        "bytesPerRoundPerPlayer": per_round,
+        "compactRatio": totals["compact"] / totals["json"],
+        "compactDeflateRatio": totals["compact_deflate"] / totals["json_deflate"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(measure(args.players, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Local stand-in for ACRCloud's /v1/identify.
+
+Answers every upload with the same successful match, after an optional
+artificial delay that mimics the real service. Point the backend at it with
+ACR_BASE_URL=http://127.0.0.1:8766.
+
+    cd backend && python -m benchmarks.stub_acrcloud --port 8766 --delay-ms 300
+"""
+
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+import uvicorn
+
+app = FastAPI()
+delay_seconds = 0.0
+
+MATCH = {
+    "status": {"code": 0, "msg": "Success"},
+    "metadata": {
+        "music": [
+            {
+                "title": "Cancion de prueba",
+                "artists": [{"name": "Artista de prueba"}],
+                "album": {"name": "Album de prueba"},
+                "score": 92,
+                "external_metadata": {
+                    "spotify": {"track": {"id": "0000000000000000000000"}},
+                    "youtube": {"vid": "00000000000"},
+                },
+            }
+        ]
+    },
+}
+
+
+@app.post("/v1/identify")
+async def identify(request: Request):
+    # Drain the multipart body like the real service would
+    await request.body()
+    if delay_seconds:
+        await asyncio.sleep(delay_seconds)
+    return MATCH
+
+
+def main():
+    global delay_seconds
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--delay-ms", type=int, default=0)
+    args = parser.parse_args()
+    delay_seconds = args.delay_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
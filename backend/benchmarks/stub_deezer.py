@@ -0,0 +1,70 @@
+"""Local stand-in for the parts of the Deezer API the backend uses.
+
+Serves /genre, /chart/{genre_id}/tracks, /track/{id} and a tiny preview file
+for every track, with deterministic data and no rate limits. Point the
+backend at it with DEEZER_API_URL=http://127.0.0.1:8765.
+
+    cd backend && python -m benchmarks.stub_deezer --port 8765
+"""
+
+import argparse
+
+from fastapi import FastAPI, Response
+import uvicorn
+
+GENRES = [(0, "All"), (132, "Pop"), (116, "Rap/Hip Hop"), (152, "Rock"), (113, "Dance"), (165, "R&B")]
+TRACKS_PER_CHART = 50
+# A single silent MPEG-1 Layer III frame; enough for the preview proxy to cache
+SILENT_MP3 = bytes.fromhex("fffb9064") + bytes(413)
+
+app = FastAPI()
+base_url = "http://127.0.0.1:8765"
+
+
+def _track(genre_id: int, n: int) -> dict:
+    track_id = genre_id * 1000 + n + 1
+    return {
+        "id": track_id,
+        "title": f"Cancion {track_id}",
+        "preview": f"{base_url}/preview/{track_id}.mp3",
+        "artist": {"name": f"Artista {track_id % 97}"},
+        "album": {
+            "title": f"Album {track_id % 31}",
+            "cover_medium": f"{base_url}/cover/{track_id}.jpg",
+            "cover_big": f"{base_url}/cover/{track_id}.jpg",
+        },
+    }
+
+
+@app.get("/genre")
+def genres():
+    return {"data": [{"id": gid, "name": name, "picture_medium": ""} for gid, name in GENRES]}
+
+
+@app.get("/chart/{genre_id}/tracks")
+def chart(genre_id: int, limit: int = TRACKS_PER_CHART):
+    return {"data": [_track(genre_id, n) for n in range(min(limit, TRACKS_PER_CHART))]}
+
+
+@app.get("/track/{track_id}")
+def track(track_id: int):
+    return _track(track_id // 1000, track_id % 1000 - 1)
+
+
+@app.get("/preview/{name}")
+def preview(name: str):
+    return Response(SILENT_MP3, media_type="audio/mpeg")
+
+
+def main():
+    global base_url
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    base_url = f"http://{args.host}:{args.port}"
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import time
+import uuid
+import asyncio
+import threading
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from mysql.connector import DatabaseError, IntegrityError
+
+from database import get_connection
+from auth import require_admin
+from deletion import deletions
+
+router = APIRouter(prefix="/admin/bulk", tags=["bulk"])
+
+BULK_MAX_ITEMS = 5000
+BULK_SYNC_MAX = 100  # larger batches run as a background job
+BULK_CHUNK = 200  # items applied per transaction
+BULK_LOOKUP_CHUNK = 1000  # ids / usernames per validation query
+BULK_JOB_TTL = 3600  # seconds a finished job stays pollable
+BULK_ACTIONS = ("delete", "role", "rename")
+USERNAME_MAX = 50  # users.username is VARCHAR(50)
+
+
+class BulkItem(BaseModel):
+    id: int
+    role: Optional[str] = None
+    username: Optional[str] = None
+
+
+class BulkBody(BaseModel):
+    action: str
+    items: list[BulkItem]
+
+
+def _chunks(values: list, size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+# ── Validation (set-based) ──
+
+def _validate(cursor, action: str, items: list[BulkItem], admin_id: int) -> tuple[list[BulkItem], dict[int, str]]:
+    """Split items into the ones to apply and {id: error} for the rest.
+
+    Existence, roles and username conflicts are looked up with one IN query
+    per BULK_LOOKUP_CHUNK values instead of a SELECT per item.
+    """
+    errors: dict[int, str] = {}
+    seen = set()
+    unique = []
+    for item in items:
+        if item.username is not None:
+            item.username = item.username.strip()
+        if item.id in seen:
+            errors[item.id] = "Usuario repetido en la operación"
+        else:
+            seen.add(item.id)
+            unique.append(item)
+
+    ids = [item.id for item in unique]
+    roles = {}
+    for chunk in _chunks(ids, BULK_LOOKUP_CHUNK):
+        cursor.execute(
+            f"SELECT id, role FROM users WHERE id IN ({_placeholders(chunk)}) AND deleted_at IS NULL", chunk
+        )
+        roles.update((r["id"], r["role"]) for r in cursor.fetchall())
+
+    taken = {}
+    if action == "rename":
+        names = list({item.username for item in unique if item.username})
+        for chunk in _chunks(names, BULK_LOOKUP_CHUNK):
+            # Returned usernames carry the stored spelling, so compare in SQL
+            # per requested name to follow the column collation
+            cursor.execute(
+                f"SELECT u.id, n.name FROM users u JOIN ("
+                f"{' UNION ALL '.join(['SELECT %s AS name'] * len(chunk))}"
+                f") n ON u.username = n.name",
+                chunk,
+            )
+            for r in cursor.fetchall():
+                taken.setdefault(r["name"], set()).add(r["id"])
+
+    valid = []
+    claimed: dict[str, int] = {}
+    for item in unique:
+        if item.id in errors:
+            continue
+        if item.id not in roles:
+            errors[item.id] = "Usuario no encontrado"
+        elif action in ("delete", "role") and item.id == admin_id:
+            errors[item.id] = "No puedes modificarte a ti mismo en una operación masiva"
+        elif action == "role" and item.role not in ("user", "admin"):
+            errors[item.id] = "Rol inválido"
+        elif action == "role" and roles[item.id] == "user":
+            errors[item.id] = "No se puede cambiar el rol de un usuario regular"
+        elif action == "rename" and not item.username:
+            errors[item.id] = "Nombre de usuario inválido"
+        elif action == "rename" and len(item.username) > USERNAME_MAX:
+            errors[item.id] = f"El nombre de usuario no puede superar {USERNAME_MAX} caracteres"
+        elif action == "rename" and taken.get(item.username, set()) - {item.id}:
+            errors[item.id] = "Ese nombre de usuario ya está en uso"
+        elif action == "rename" and item.username.casefold() in claimed:
+            errors[item.id] = "Nombre de usuario repetido en la operación"
+        else:
+            if action == "rename":
+                claimed[item.username.casefold()] = item.id
+            valid.append(item)
+    return valid, errors
+
+
+# ── Execution ──
+
+def _apply_chunk(cursor, action: str, chunk: list[BulkItem]):
+    ids = [item.id for item in chunk]
+    if action == "delete":
+        deletions.soft_delete(cursor, ids)
+    elif action == "role":
+        by_role: dict[str, list[int]] = {}
+        for item in chunk:
+            by_role.setdefault(item.role, []).append(item.id)
+        for role, role_ids in by_role.items():
+            cursor.execute(
+                f"UPDATE users SET role = %s WHERE id IN ({_placeholders(role_ids)})", [role, *role_ids]
+            )
+    else:
+        cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        values = [v for item in chunk for v in (item.id, item.username)]
+        cursor.execute(
+            f"UPDATE users SET username = CASE id {cases} END WHERE id IN ({_placeholders(ids)})",
+            [*values, *ids],
+        )
+
+
+class BulkJob:
+    def __init__(self, action: str, items: list[BulkItem], admin_id: int):
+        self.id = uuid.uuid4().hex
+        self.action = action
+        self.items = items
+        self.admin_id = admin_id
+        self.status = "pending"
+        self.processed = 0
+        self.results: dict[int, dict] = {}
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+
+    def _result(self, item_id: int, ok: bool, detail: str | None = None):
+        self.results[item_id] = {"id": item_id, "status": "ok" if ok else "error", "detail": detail}
+
+    def run(self):
+        """Validate everything up front, then apply BULK_CHUNK items per transaction.
+
+        A chunk that trips a unique key (a concurrent rename or signup) or a
+        column limit is rolled back and retried item by item, so one bad item
+        only fails itself.
+        """
+        self.status = "running"
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            valid, errors = _validate(cursor, self.action, self.items, self.admin_id)
+            conn.commit()
+            for item_id, detail in errors.items():
+                self._result(item_id, False, detail)
+            self.processed = len(self.items) - len(valid)
+
+            for chunk in _chunks(valid, BULK_CHUNK):
+                try:
+                    _apply_chunk(cursor, self.action, chunk)
+                    conn.commit()
+                    if self.action == "delete":
+                        deletions.start([item.id for item in chunk])
+                    for item in chunk:
+                        self._result(item.id, True)
+                except DatabaseError:
+                    conn.rollback()
+                    for item in chunk:
+                        try:
+                            _apply_chunk(cursor, self.action, [item])
+                            conn.commit()
+                            if self.action == "delete":
+                                deletions.start([item.id])
+                            self._result(item.id, True)
+                        except IntegrityError:
+                            conn.rollback()
+                            self._result(item.id, False, "Conflicto con otro usuario")
+                        except DatabaseError:
+                            conn.rollback()
+                            self._result(item.id, False, "Valor no válido para la base de datos")
+                self.processed += len(chunk)
+            self.status = "done"
+        except Exception as e:
+            conn.rollback()
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            cursor.close()
+            conn.close()
+            self.finished_at = time.time()
+
+    def to_json(self, with_results: bool = True) -> dict:
+        results = list(self.results.values())
+        data = {
+            "jobId": self.id,
+            "action": self.action,
+            "status": self.status,
+            "total": len(self.items),
+            "processed": self.processed,
+            "succeeded": sum(1 for r in results if r["status"] == "ok"),
+            "failed": sum(1 for r in results if r["status"] == "error"),
+            "error": self.error,
+        }
+        if with_results:
+            data["results"] = results
+        return data
+
+
+_jobs: dict[str, BulkJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def _register(job: BulkJob):
+    now = time.time()
+    with _jobs_lock:
+        for job_id, old in list(_jobs.items()):
+            if old.finished_at and now - old.finished_at > BULK_JOB_TTL:
+                del _jobs[job_id]
+        _jobs[job.id] = job
+
+
+@router.post("")
+async def run_bulk(body: BulkBody, admin: dict = Depends(require_admin)):
+    """Apply one action to many users.
+
+    Up to BULK_SYNC_MAX items run inline and return per-item results; larger
+    batches return 202 with a job id to poll at GET /admin/bulk/{jobId}.
+    """
+    if body.action not in BULK_ACTIONS:
+        raise HTTPException(status_code=400, detail="Acción inválida")
+    if not body.items:
+        raise HTTPException(status_code=400, detail="No se proporcionaron usuarios")
+    if len(body.items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BULK_MAX_ITEMS} usuarios por operación")
+
+    job = BulkJob(body.action, body.items, admin["id"])
+    if len(body.items) <= BULK_SYNC_MAX:
+        await asyncio.to_thread(job.run)
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail="Error al aplicar la operación masiva")
+        return job.to_json()
+
+    _register(job)
+    job.task = asyncio.create_task(asyncio.to_thread(job.run))
+    return JSONResponse(status_code=202, content=job.to_json(with_results=False))
+
+
+@router.get("/{job_id}")
+def get_bulk_job(job_id: str, results: bool = False, admin: dict = Depends(require_admin)):
+    """Progress of a background job; per-item results once it finishes (or with ?results=true)."""
+    job = _jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Operación no encontrada")
+    return job.to_json(with_results=results or job.status in ("done", "failed"))
@@ -1,4 +1,5 @@
 import os
+import time
 from mysql.connector import pooling
 from dotenv import load_dotenv
 
@@ -24,9 +25,84 @@ if os.getenv("DB_SSL", "").lower() in ("true", "1", "yes"):
 
 pool = pooling.MySQLConnectionPool(**db_config)
 
+# Instrumentation hooks: query listeners get (sql, params, seconds) for every
+# statement, checkout listeners get the seconds spent taking a pool connection.
+# With no listeners registered connections are returned unwrapped.
+_query_listeners = []
+_checkout_listeners = []
+
+
+def on_query(fn):
+    _query_listeners.append(fn)
+    return fn
+
+
+def on_checkout(fn):
+    _checkout_listeners.append(fn)
+    return fn
+
+
+class TracedCursor:
+    """Cursor proxy that reports each executed statement to the query listeners."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+        return False
+
+    def _report(self, operation, params, started: float):
+        elapsed = time.perf_counter() - started
+        for fn in _query_listeners:
+            fn(operation, params, elapsed)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._report(operation, params, started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._report(operation, seq_params, started)
+
+
+class TracedConnection:
+    """Pooled connection proxy whose cursors are TracedCursor."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._conn.cursor(*args, **kwargs))
+
 
 def get_connection():
-    return pool.get_connection()
+    if not _query_listeners and not _checkout_listeners:
+        return pool.get_connection()
+    started = time.perf_counter()
+    conn = pool.get_connection()
+    waited = time.perf_counter() - started
+    for fn in _checkout_listeners:
+        fn(waited)
+    return TracedConnection(conn) if _query_listeners else conn
 
 
 def init_db():
@@ -49,6 +125,7 @@ def init_db():
         ("role", "VARCHAR(20) NOT NULL DEFAULT 'user'"),
         ("avatar", "VARCHAR(20) NOT NULL DEFAULT 'default'"),
         ("google_id", "VARCHAR(255) UNIQUE"),
+        ("deleted_at", "TIMESTAMP NULL DEFAULT NULL"),
     ]:
         try:
             cursor.execute(f"ALTER TABLE users ADD COLUMN {col} {definition}")
@@ -61,6 +138,18 @@ def init_db():
         conn.commit()
     except Exception:
         pass
+    # Keyset pagination indexes for the admin user list, and the pending
+    # deletions scan (fail harmlessly if present)
+    for index, columns in [
+        ("idx_users_created", "created_at, id"),
+        ("idx_users_role_created", "role, created_at, id"),
+        ("idx_users_deleted", "deleted_at"),
+    ]:
+        try:
+            cursor.execute(f"CREATE INDEX {index} ON users ({columns})")
+            conn.commit()
+        except Exception:
+            pass
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS search_history (
             id INT AUTO_INCREMENT PRIMARY KEY,
@@ -109,6 +198,96 @@ def init_db():
             UNIQUE KEY unique_friendship (sender_id, receiver_id)
         )
     """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_results (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            room_id VARCHAR(32) NOT NULL,
+            creator_id INT,
+            rounds INT NOT NULL DEFAULT 0,
+            winner_id INT DEFAULT NULL,
+            started_at TIMESTAMP NULL,
+            ended_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (creator_id) REFERENCES users(id) ON DELETE SET NULL,
+            FOREIGN KEY (winner_id) REFERENCES users(id) ON DELETE SET NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_rounds (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            game_id INT NOT NULL,
+            round_no INT NOT NULL,
+            genre_id INT NOT NULL DEFAULT 0,
+            title VARCHAR(255) NOT NULL,
+            artist VARCHAR(255) NOT NULL,
+            winner_id INT DEFAULT NULL,
+            response_ms INT DEFAULT NULL,
+            FOREIGN KEY (game_id) REFERENCES game_results(id) ON DELETE CASCADE,
+            FOREIGN KEY (winner_id) REFERENCES users(id) ON DELETE SET NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS game_players (
+            game_id INT NOT NULL,
+            user_id INT NOT NULL,
+            score INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (game_id, user_id),
+            FOREIGN KEY (game_id) REFERENCES game_results(id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    # Running totals maintained incrementally by the result writer
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS player_scores (
+            user_id INT PRIMARY KEY,
+            total_score INT NOT NULL DEFAULT 0,
+            games_played INT NOT NULL DEFAULT 0,
+            wins INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS player_genre_scores (
+            user_id INT NOT NULL,
+            genre_id INT NOT NULL,
+            score INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, genre_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    # search_log rollups, filled incrementally by analytics.RollupJob
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name VARCHAR(50) PRIMARY KEY,
+            last_id INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_volume_hourly (
+            hour DATETIME PRIMARY KEY,
+            searches INT NOT NULL DEFAULT 0,
+            score_sum DOUBLE NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_song_daily (
+            day DATE NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            artist VARCHAR(255) NOT NULL,
+            searches INT NOT NULL DEFAULT 0,
+            score_sum DOUBLE NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, title, artist)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_user_daily (
+            day DATE NOT NULL,
+            user_id INT NOT NULL,
+            searches INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id)
+        )
+    """)
     conn.commit()
     cursor.close()
     conn.close()
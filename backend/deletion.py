@@ -0,0 +1,231 @@
+import time
+import asyncio
+import threading
+
+from fastapi import APIRouter, HTTPException, Depends
+
+from database import get_connection
+from auth import require_admin, revoke_user
+from friends import friend_graph
+from leaderboard import forget_user, writer
+from notifications import hub
+from sampler import user_history
+from game import evict_user
+
+router = APIRouter(prefix="/admin/deletions", tags=["deletions"])
+
+DELETION_BATCH = 1000  # dependent rows removed per transaction
+DELETION_PAUSE = 0.05  # seconds between batches, so other writers get the locks
+DELETION_POLL = 5  # seconds between scans for soft-deleted users
+DELETION_KEEP = 3600  # seconds finished deletions stay in the progress report
+
+# (table, user column, key column, action). Each step walks the user's rows
+# in key order and deletes (or un-links) one key range per transaction.
+# player_scores and player_genre_scores hold a handful of rows per user and
+# are left to the final cascade.
+PURGE_STEPS = (
+    ("search_log", "user_id", "id", "delete"),
+    ("search_history", "user_id", "id", "delete"),
+    ("friendships", "sender_id", "id", "delete"),
+    ("friendships", "receiver_id", "id", "delete"),
+    ("game_players", "user_id", "game_id", "delete"),
+    ("game_rounds", "winner_id", "id", "null"),
+    ("game_results", "winner_id", "id", "null"),
+    ("game_results", "creator_id", "id", "null"),
+)
+
+
+class DeletionProgress:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.status = "pending"
+        self.rows: dict[str, int] = {}
+        self.error: str | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def to_json(self) -> dict:
+        return {
+            "userId": self.user_id,
+            "status": self.status,
+            "rows": self.rows,
+            "error": self.error,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+
+def _purge_step(cursor, conn, user_id: int, table: str, column: str, key: str, action: str, progress: DeletionProgress):
+    label = f"{table}.{column}"
+    progress.rows.setdefault(label, 0)
+    change = (
+        f"DELETE FROM {table}" if action == "delete" else f"UPDATE {table} SET {column} = NULL"
+    )
+    while True:
+        cursor.execute(
+            f"SELECT {key} FROM {table} WHERE {column} = %s ORDER BY {key} LIMIT %s",
+            (user_id, DELETION_BATCH),
+        )
+        keys = [r[0] for r in cursor.fetchall()]
+        if not keys:
+            conn.commit()
+            return
+        cursor.execute(
+            f"{change} WHERE {column} = %s AND {key} >= %s AND {key} <= %s",
+            (user_id, keys[0], keys[-1]),
+        )
+        progress.rows[label] += cursor.rowcount
+        conn.commit()
+        time.sleep(DELETION_PAUSE)
+
+
+class UserDeletions:
+    """Two-phase user deletion.
+
+    The admin request only sets users.deleted_at, revokes the user's tokens
+    and evicts them from rooms and in-memory caches. A background worker then
+    removes the dependent rows in key-ranged batches of DELETION_BATCH, each
+    in its own short transaction, and deletes the user row last, so the
+    ON DELETE CASCADE has nothing left to lock. deleted_at is the durable
+    queue: a purge interrupted by a restart is picked up on the next scan.
+    """
+
+    def __init__(self):
+        self._progress: dict[int, DeletionProgress] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    # ── Phase 1: soft delete ──
+
+    def soft_delete(self, cursor, user_ids: list[int]):
+        """Mark users deleted in the caller's transaction; call start() after commit."""
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        cursor.execute(
+            f"UPDATE users SET deleted_at = NOW() WHERE id IN ({placeholders}) AND deleted_at IS NULL",
+            user_ids,
+        )
+
+    def start(self, user_ids: list[int]):
+        """Revoke and evict right away; safe to call from the threadpool."""
+        for uid in user_ids:
+            revoke_user(uid)
+            with self._lock:
+                if uid not in self._progress or self._progress[uid].status in ("done", "failed"):
+                    self._progress[uid] = DeletionProgress(uid)
+            self._submit(uid)
+
+    def _submit(self, user_id: int):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(self._evict(user_id))
+        else:
+            asyncio.run_coroutine_threadsafe(self._evict(user_id), loop)
+
+    async def _evict(self, user_id: int):
+        # Rooms first: closing one finishes its game, which feeds the boards
+        await evict_user(user_id)
+        forget_user(user_id)
+        friend_graph.forget(user_id)
+        user_history.forget(user_id)
+        await hub.drop(user_id)
+
+    # ── Phase 2: purge ──
+
+    def _pending(self) -> list[int]:
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT id FROM users WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT 100"
+            )
+            return [r[0] for r in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def purge(self, user_id: int):
+        with self._lock:
+            progress = self._progress.get(user_id)
+            if progress is None:
+                # Left over from before a restart
+                progress = self._progress[user_id] = DeletionProgress(user_id)
+        progress.status = "running"
+        progress.error = None
+        progress.started_at = progress.started_at or time.time()
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            for step in PURGE_STEPS:
+                _purge_step(cursor, conn, user_id, *step, progress)
+            cursor.execute("DELETE FROM users WHERE id = %s AND deleted_at IS NOT NULL", (user_id,))
+            conn.commit()
+            progress.status = "done"
+        except Exception as e:
+            conn.rollback()
+            progress.status = "failed"
+            progress.error = str(e)
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+            progress.finished_at = time.time()
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            for uid, progress in list(self._progress.items()):
+                if progress.finished_at and now - progress.finished_at > DELETION_KEEP:
+                    del self._progress[uid]
+
+    async def run_forever(self):
+        self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                pending = await asyncio.to_thread(self._pending)
+            except Exception:
+                pending = []
+            for uid in pending:
+                try:
+                    # Also covers deletions requested before a restart or on
+                    # another worker, whose token revocation never reached this one
+                    revoke_user(uid)
+                    await self._evict(uid)
+                    # Game results queued before the eviction must land before
+                    # the purge, or they would re-create the user's rows
+                    await writer.settle()
+                    await asyncio.to_thread(self.purge, uid)
+                except Exception:
+                    pass
+            self._prune()
+            await asyncio.sleep(DELETION_POLL)
+
+    def progress(self, user_id: int) -> dict | None:
+        progress = self._progress.get(user_id)
+        return progress.to_json() if progress else None
+
+    def all_progress(self) -> list[dict]:
+        with self._lock:
+            items = list(self._progress.values())
+        return [p.to_json() for p in items]
+
+
+deletions = UserDeletions()
+
+
+@router.get("")
+def list_deletions(admin: dict = Depends(require_admin)):
+    return deletions.all_progress()
+
+
+@router.get("/{user_id}")
+def get_deletion(user_id: int, admin: dict = Depends(require_admin)):
+    progress = deletions.progress(user_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No hay una eliminación para ese usuario")
+    return progress
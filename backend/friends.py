@@ -0,0 +1,112 @@
+import time
+import threading
+from collections import OrderedDict
+
+from database import get_connection
+
+FRIEND_CACHE_TTL = 600  # 10 minutes
+FRIEND_CACHE_MAX = 5000
+
+
+class FriendGraph:
+    """Cached friendship adjacency: user id -> accepted friends with their profile.
+
+    Entries expire after FRIEND_CACHE_TTL and the least recently used are
+    dropped past FRIEND_CACHE_MAX. social.py reports friendship changes so
+    cached entries and listeners (e.g. leaderboard views) stay current.
+
+    It is used from threadpool endpoints and from the event loop, so the
+    dict is only touched under a lock; the DB load runs outside it and
+    friends() hands out a copy.
+    """
+
+    def __init__(self, ttl: int = FRIEND_CACHE_TTL, max_users: int = FRIEND_CACHE_MAX):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._adj: OrderedDict[int, tuple[float, dict, dict[int, dict]]] = OrderedDict()
+        self._listeners: list = []
+        self._lock = threading.Lock()
+
+    def on_change(self, fn):
+        """Register fn(kind, a, b), called with kind "added" or "removed"."""
+        self._listeners.append(fn)
+
+    def _entry(self, user_id: int):
+        with self._lock:
+            entry = self._adj.get(user_id)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self._adj.move_to_end(user_id)
+                return entry
+        entry = self._load(user_id)
+        with self._lock:
+            self._adj[user_id] = entry
+            while len(self._adj) > self.max_users:
+                self._adj.popitem(last=False)
+        return entry
+
+    def friends(self, user_id: int) -> dict[int, dict]:
+        entry = self._entry(user_id)
+        with self._lock:
+            return dict(entry[2])
+
+    def profile(self, user_id: int) -> dict:
+        return self._entry(user_id)[1]
+
+    def _load(self, user_id: int):
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """SELECT u.id, u.username, u.avatar
+                   FROM friendships f
+                   JOIN users u ON u.id = CASE WHEN f.sender_id = %s THEN f.receiver_id ELSE f.sender_id END
+                       AND u.deleted_at IS NULL
+                   WHERE (f.sender_id = %s OR f.receiver_id = %s) AND f.status = 'accepted'
+                   UNION ALL
+                   SELECT id, username, avatar FROM users WHERE id = %s""",
+                (user_id, user_id, user_id, user_id),
+            )
+            friends = {}
+            me = {"username": "", "avatar": "default"}
+            for r in cursor.fetchall():
+                profile = {"username": r["username"], "avatar": r.get("avatar", "default")}
+                if r["id"] == user_id:
+                    me = profile
+                else:
+                    friends[r["id"]] = profile
+            return (time.time(), me, friends)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def added(self, a: int, b: int):
+        # Profiles of the new friend are not at hand: reload both lazily
+        with self._lock:
+            self._adj.pop(a, None)
+            self._adj.pop(b, None)
+        for fn in self._listeners:
+            fn("added", a, b)
+
+    def removed(self, a: int, b: int):
+        with self._lock:
+            for x, y in ((a, b), (b, a)):
+                entry = self._adj.get(x)
+                if entry is not None:
+                    entry[2].pop(y, None)
+        for fn in self._listeners:
+            fn("removed", a, b)
+
+    def forget(self, user_id: int):
+        """Drop a deleted user's entry and remove them from cached friend lists."""
+        with self._lock:
+            entry = self._adj.pop(user_id, None)
+            friends = set(entry[2]) if entry else set()
+            for other, (_, _, adj) in self._adj.items():
+                if adj.pop(user_id, None) is not None:
+                    friends.add(other)
+        for other in friends:
+            for fn in self._listeners:
+                fn("removed", user_id, other)
+
+
+friend_graph = FriendGraph()
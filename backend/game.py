@@ -1,24 +1,39 @@
 import os
+import gzip
+import json
 import time
+import signal
+import logging
+import tempfile
+import heapq
 import random
 import secrets
 import asyncio
+from collections import deque
 
-import httpx
-import jwt
-from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
-from auth import get_current_user, JWT_SECRET, JWT_ALGORITHM
+from auth import get_current_user, require_admin, decode_token
 from database import get_connection
+from metrics import http_client
+from notifications import hub
+from game_sessions import sessions
+from preview_cache import preview_cache, DEEZER_API_URL
+from sampler import RoomSampler, catalog, user_history
+from leaderboard import GameRecord, record_game
+from supervisor import SupervisedConnection, stats as connection_stats
+from spectators import SpectatorTier
+from friends import friend_graph
+import protocol
 
 load_dotenv()
 
 router = APIRouter(prefix="/game", tags=["game"])
 
-# In-memory session store
-_sessions: dict[str, dict] = {}
+logger = logging.getLogger("oido.game")
 
 # Deezer chart cache (per genre_id)
 _chart_cache: dict[int, dict] = {}
@@ -29,21 +44,14 @@ _genre_cache: dict = {"data": None, "fetched_at": 0}
 GENRE_CACHE_TTL = 3600  # 1 hour
 
 
-def _cleanup_sessions():
-    now = time.time()
-    expired = [k for k, v in _sessions.items() if now - v["created_at"] > 300]
-    for k in expired:
-        del _sessions[k]
-
-
 async def _fetch_genres() -> list[dict]:
     now = time.time()
     if _genre_cache["data"] and (now - _genre_cache["fetched_at"]) < GENRE_CACHE_TTL:
         return _genre_cache["data"]
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get("https://api.deezer.com/genre")
+        async with http_client(timeout=10) as client:
+            resp = await client.get(f"{DEEZER_API_URL}/genre")
             resp.raise_for_status()
             data = resp.json()
     except Exception as e:
@@ -75,8 +83,8 @@ async def _fetch_chart_tracks(genre_id: int = 0) -> list[dict]:
         return cached["data"]
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(f"https://api.deezer.com/chart/{genre_id}/tracks?limit=50")
+        async with http_client(timeout=10) as client:
+            resp = await client.get(f"{DEEZER_API_URL}/chart/{genre_id}/tracks?limit=50")
             resp.raise_for_status()
             data = resp.json()
     except Exception as e:
@@ -89,13 +97,19 @@ async def _fetch_chart_tracks(genre_id: int = 0) -> list[dict]:
         preview = t.get("preview")
         if not preview:
             continue
-        tracks.append({
+        track_id = t.get("id")
+        if track_id:
+            preview_cache.remember(track_id, preview)
+        track = {
+            "id": track_id,
             "title": t.get("title", ""),
             "artist": t.get("artist", {}).get("name", ""),
             "album": t.get("album", {}).get("title", ""),
             "cover": t.get("album", {}).get("cover_big", "") or t.get("album", {}).get("cover_medium", ""),
             "preview_url": preview,
-        })
+        }
+        track["idx"] = catalog.add(track)
+        tracks.append(track)
 
     if tracks:
         _chart_cache[genre_id] = {"data": tracks, "fetched_at": now}
@@ -103,6 +117,65 @@ async def _fetch_chart_tracks(genre_id: int = 0) -> list[dict]:
     return tracks
 
 
+def _prefetch_track(track: dict):
+    """Warm the preview file for a track."""
+    preview_cache.prefetch(track.get("id"))
+
+
+def _preview_path(track: dict) -> str:
+    """URL clients should play: the local proxy when the Deezer id is known."""
+    if track.get("id"):
+        return f"/game/preview/{track['id']}"
+    return track["preview_url"]
+
+
+def start_background_tasks():
+    """Start periodic sweeps; called from the app startup hook."""
+    asyncio.create_task(sessions.sweep_forever())
+    restore_rooms_snapshot()
+    _install_sigterm_snapshot()
+    asyncio.create_task(_snapshot_forever())
+
+
+class RoundStats:
+    """Prefetch hit rate and the delay between a round request and game_start.
+
+    Only rounds after the first are counted: nothing can be prefetched
+    before a game starts, so round 1 is always a cold start.
+    """
+
+    def __init__(self):
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+        self.gap_count = 0
+        self.gap_total = 0.0
+        self.gap_max = 0.0
+
+    def record_prefetch(self, hit: bool):
+        if hit:
+            self.prefetch_hits += 1
+        else:
+            self.prefetch_misses += 1
+
+    def record_gap(self, seconds: float):
+        self.gap_count += 1
+        self.gap_total += seconds
+        self.gap_max = max(self.gap_max, seconds)
+
+    def as_dict(self) -> dict:
+        rounds = self.prefetch_hits + self.prefetch_misses
+        return {
+            "prefetchHits": self.prefetch_hits,
+            "prefetchMisses": self.prefetch_misses,
+            "prefetchHitRate": self.prefetch_hits / rounds if rounds else None,
+            "roundGapAvgMs": self.gap_total / self.gap_count * 1000 if self.gap_count else None,
+            "roundGapMaxMs": self.gap_max * 1000,
+        }
+
+
+round_stats = RoundStats()
+
+
 # ── Existing REST endpoints (kept for single-player backwards compat) ──
 
 @router.get("/genres")
@@ -111,29 +184,36 @@ async def get_genres(user: dict = Depends(get_current_user)):
     return {"genres": genres}
 
 
+@router.get("/stats")
+def get_game_stats(admin: dict = Depends(require_admin)):
+    return {
+        "rooms": len(rooms),
+        "spectators": sum(len(r.spectators) for r in rooms.values()),
+        "rounds": round_stats.as_dict(),
+        "connections": connection_stats.as_dict(),
+    }
+
+
 @router.get("/song")
 async def get_song(genre_id: int = Query(0), user: dict = Depends(get_current_user)):
-    _cleanup_sessions()
-
     tracks = await _fetch_chart_tracks(genre_id)
     if not tracks:
         raise HTTPException(status_code=503, detail="No hay canciones disponibles")
 
-    track = random.choice(tracks)
+    track = user_history.pick(user["id"], tracks)
 
-    token = secrets.token_urlsafe(32)
-    _sessions[token] = {
+    token = sessions.create({
         "title": track["title"],
         "artist": track["artist"],
         "album": track["album"],
         "cover": track["cover"],
-        "preview_url": track["preview_url"],
-        "created_at": time.time(),
-    }
+    })
+
+    _prefetch_track(track)
 
     return {
         "sessionToken": token,
-        "previewUrl": track["preview_url"],
+        "previewUrl": _preview_path(track),
     }
 
 
@@ -142,7 +222,7 @@ async def reveal_song(
     sessionToken: str = Query(...),
     user: dict = Depends(get_current_user),
 ):
-    session = _sessions.get(sessionToken)
+    session = sessions.pop(sessionToken)
     if not session:
         raise HTTPException(status_code=404, detail="Sesion de juego no encontrada o expirada")
 
@@ -152,34 +232,91 @@ async def reveal_song(
         "album": session["album"],
         "cover": session["cover"],
     }
-    del _sessions[sessionToken]
     return {"song": song_info}
 
 
+@router.get("/preview/{track_id}")
+async def get_preview(track_id: int, request: Request):
+    """Serve a cached Deezer preview. Range requests are handled by FileResponse.
+
+    Only tracks from charts this server listed are served: <audio> cannot
+    send the auth header, and arbitrary ids would turn the cache into an open
+    Deezer proxy that evicts the previews games actually need.
+    """
+    if not preview_cache.known(track_id):
+        raise HTTPException(status_code=404, detail="Preview no disponible")
+    path = await preview_cache.get(track_id)
+    try:
+        stat = await asyncio.to_thread(os.stat, path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Preview no disponible")
+    # With a stat_result FileResponse sets the ETag up front instead of in __call__
+    response = FileResponse(
+        path, media_type="audio/mpeg", stat_result=stat, headers={"Cache-Control": "public, max-age=86400"},
+    )
+    etag = response.headers.get("etag")
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "public, max-age=86400"})
+    return response
+
+
 # ── Multiplayer WebSocket ──
 
 def _authenticate_ws(token: str) -> dict | None:
     """Authenticate a WebSocket connection using a JWT token."""
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return {
-            "id": payload["sub"],
-            "username": payload["username"],
-            "role": payload.get("role", "user"),
-        }
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-        return None
+    return decode_token(token)
+
+
+PLAY_SECONDS = 30
+THINK_SECONDS = 10
+RECONNECT_GRACE = 20  # Seconds a dropped player keeps their slot
+RECONNECT_BUFFER_SIZE = 32
+MAX_PLAYERS_PER_ROOM = int(os.getenv("GAME_MAX_PLAYERS_PER_ROOM", "8"))
+MAX_ROOMS_PER_CREATOR = int(os.getenv("GAME_MAX_ROOMS_PER_CREATOR", "3"))
+
+
+def _running(task: asyncio.Task | None) -> bool:
+    return task is not None and not task.done()
 
 
 class PlayerConnection:
-    def __init__(self, ws: WebSocket, user_id: int, username: str, role: str):
+    def __init__(self, ws: WebSocket | None, user_id: int, username: str, role: str, compact: bool = False):
         self.ws = ws
+        self.compact = compact  # Negotiated with ?proto=compact, see protocol.py
+        self.players_delta = protocol.PlayerListDelta()
         self.user_id = user_id
         self.username = username
         self.role = role
         self.score = 0
         self.can_stop = True      # Can press PARAR this round
         self.has_stopped = False   # Currently in THINKING (pressed PARAR)
+        # Messages broadcast while detached, replayed on reconnect
+        self.buffer: deque[dict] = deque(maxlen=RECONNECT_BUFFER_SIZE)
+        self.buffer_overflowed = False
+        self.grace_task: asyncio.Task | None = None
+
+    @property
+    def attached(self) -> bool:
+        # Detached players (dropped connection or restored from a snapshot)
+        # keep their slot until they reconnect or the grace period ends
+        return self.ws is not None
+
+    def encode(self, msg: dict) -> str:
+        if not self.compact:
+            return protocol.dumps(msg)
+        if msg.get("type") == "players":
+            return protocol.dumps(self.players_delta.encode(msg["players"]))
+        return protocol.dumps(protocol.encode(msg))
+
+    async def send(self, msg: dict):
+        text = self.encode(msg)
+        connection_stats.bytes_out += len(text)
+        await self.ws.send_text(text)
+
+    def buffer_message(self, msg: dict):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.buffer_overflowed = True
+        self.buffer.append(msg)
 
 
 class RoomState:
@@ -196,19 +333,67 @@ class RoomState:
         self.creator_username = creator_username
         self.invited_ids = invited_ids
         self.created_at = time.time()
-        self.state: str = self.LOBBY
+        self._state: str = self.LOBBY
         self.players: dict[int, PlayerConnection] = {}
         self.current_song: dict | None = None
         self.stopper_id: int | None = None
         self.selected_genres: list[int] = []
+        self._next_track: dict | None = None
+        self._prefetch_task: asyncio.Task | None = None
+        self.sampler = RoomSampler()
+        self.game_record: GameRecord | None = None
+        self.rounds_loaded = 0
+        self.round_started_at: float = 0
+        self.response_ms: int | None = None
         self._think_timer: asyncio.Task | None = None
         self._play_timer: asyncio.Task | None = None
+        self.play_deadline: float = 0
+        self.think_deadline: float = 0
+        self.spectators = SpectatorTier(self.spectator_view)
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, value: str):
+        changed = value != self._state
+        self._state = value
+        if changed:
+            self._publish_summary()
+            if value == self.ROUND_END:
+                # Retry in case the prefetch started with the round failed
+                self._start_prefetch()
+
+    # ── Lobby notifications ──
+
+    def summary(self) -> dict:
+        return {
+            "roomId": self.room_id,
+            "creatorUsername": self.creator_username,
+            "creatorId": self.creator_id,
+            "playerCount": len(self.players),
+            "state": self._state,
+            "createdAt": self.created_at,
+        }
+
+    def member_ids(self) -> set[int]:
+        return {self.creator_id, *self.invited_ids}
+
+    def _publish_summary(self):
+        # Only rooms still registered are visible in the lobby
+        if rooms.get(self.room_id) is self:
+            hub.publish(self.member_ids(), {"type": "room_updated", "room": self.summary()})
 
     # ── Player management ──
 
     async def add_player(self, pc: PlayerConnection):
         if self.state != self.LOBBY:
-            await pc.ws.send_json({"type": "error", "message": "La partida ya comenzó. Espera a que vuelvan al lobby."})
+            await pc.send({"type": "error", "message": "La partida ya comenzó. Espera a que vuelvan al lobby."})
+            await pc.ws.close()
+            return False
+        if len(self.players) >= MAX_PLAYERS_PER_ROOM:
+            await pc.send({"type": "error", "message": "La sala está llena"})
             await pc.ws.close()
             return False
         self.players[pc.user_id] = pc
@@ -225,6 +410,7 @@ class RoomState:
         # If the stopper disconnected during THINKING, cancel timer and go to ROUND_END
         if self.state == self.THINKING and self.stopper_id == user_id:
             self._cancel_think_timer()
+            self._record_round(None)
             self.state = self.ROUND_END
             song = self._song_info()
             await self.broadcast({
@@ -236,22 +422,68 @@ class RoomState:
         if not self.players:
             self._reset()
             rooms.pop(self.room_id, None)
+            self.spectators.close({"type": "room_closed", "message": "La sala se cerró"})
+            return
+        await self.broadcast_player_list()
+
+    async def detach(self, user_id: int, ws: WebSocket):
+        """Connection dropped: keep the slot for RECONNECT_GRACE seconds during a game."""
+        pc = self.players.get(user_id)
+        if not pc or pc.ws is not ws:
+            return
+        if self.state == self.LOBBY:
+            await self.remove_player(user_id, ws)
             return
+        pc.ws = None
+        self._start_grace(pc, RECONNECT_GRACE)
         await self.broadcast_player_list()
 
+    def _start_grace(self, pc: PlayerConnection, grace: float):
+        if pc.grace_task and not pc.grace_task.done():
+            pc.grace_task.cancel()
+        pc.grace_task = asyncio.create_task(self._expire_player(pc.user_id, grace))
+
+    async def _expire_player(self, user_id: int, grace: float):
+        try:
+            await asyncio.sleep(grace)
+        except asyncio.CancelledError:
+            return
+        pc = self.players.get(user_id)
+        if pc and not pc.attached:
+            await self.remove_player(user_id, None)
+
     # ── Broadcast helpers ──
 
     async def broadcast(self, msg: dict):
-        disconnected = []
-        for uid, pc in self.players.items():
+        # Serialize once per wire format; player lists are per-connection deltas in compact mode
+        per_connection = msg.get("type") == "players"
+        encoded: dict[bool, str] = {}
+        dropped = []
+        for pc in self.players.values():
+            if not pc.attached:
+                pc.buffer_message(msg)
+                continue
+            if per_connection and pc.compact:
+                text = pc.encode(msg)
+            else:
+                text = encoded.get(pc.compact)
+                if text is None:
+                    text = encoded[pc.compact] = pc.encode(msg)
             try:
-                await pc.ws.send_json(msg)
+                connection_stats.bytes_out += len(text)
+                connection_stats.messages_out += 1
+                await pc.ws.send_text(text)
             except Exception:
-                disconnected.append(uid)
-        for uid in disconnected:
-            self.players.pop(uid, None)
-
-    async def broadcast_player_list(self):
+                dropped.append(pc)
+        for pc in dropped:
+            # Half-open socket: treat like a disconnect, the message waits in the buffer
+            pc.ws = None
+            pc.buffer_message(msg)
+            self._start_grace(pc, RECONNECT_GRACE)
+        # Watchers get a coalesced view later, never on this path
+        self.spectators.notify(msg)
+
+    def _players_message(self) -> dict:
         players_data = [
             {
                 "id": pc.user_id,
@@ -259,18 +491,27 @@ class RoomState:
                 "isCreator": pc.user_id == self.creator_id,
                 "score": pc.score,
                 "canStop": pc.can_stop,
+                "connected": pc.attached,
             }
             for pc in self.players.values()
         ]
-        await self.broadcast({"type": "players", "players": players_data})
+        return {"type": "players", "players": players_data}
+
+    async def broadcast_player_list(self):
+        await self.broadcast(self._players_message())
+        self._publish_summary()
 
     # ── Game flow ──
 
-    async def start_game(self, genre_ids: list[int]):
+    async def start_game(self, genre_ids: list[int], popularity_bias: bool = False):
         if self.state != self.LOBBY:
             return
         self.selected_genres = genre_ids
+        self.sampler.reset()
+        self.sampler.popularity_bias = popularity_bias
         self.state = self.PLAYING
+        self.game_record = GameRecord(self.room_id, self.creator_id, self.players.keys())
+        self.rounds_loaded = 0
         # Reset scores for a new game
         for pc in self.players.values():
             pc.score = 0
@@ -278,27 +519,76 @@ class RoomState:
             pc.has_stopped = False
         await self._load_and_send_song()
 
-    async def _load_and_send_song(self):
-        """Load a random song from selected genres and broadcast to all players."""
+    async def _pick_track(self) -> dict | None:
         genre_id = random.choice(self.selected_genres) if self.selected_genres else 0
         tracks = await _fetch_chart_tracks(genre_id)
-        if not tracks:
+        track = self.sampler.draw(genre_id, tracks)
+        return {**track, "genre_id": genre_id} if track else None
+
+    async def _prepare_next_track(self):
+        try:
+            track = await self._pick_track()
+        except HTTPException:
+            return
+        if track and self.state != self.LOBBY:
+            self._next_track = track
+            _prefetch_track(track)
+
+    def _start_prefetch(self):
+        """Pick and warm the next round's track unless one is ready or in flight."""
+        if self._next_track is not None:
+            return
+        if self._prefetch_task is not None and not self._prefetch_task.done():
+            return
+        self._prefetch_task = asyncio.create_task(self._prepare_next_track())
+
+    def _cancel_prefetch(self):
+        if self._prefetch_task and not self._prefetch_task.done():
+            self._prefetch_task.cancel()
+        self._prefetch_task = None
+        self._next_track = None
+
+    async def _take_next_track(self) -> dict | None:
+        if self._next_track is None and self._prefetch_task is not None and not self._prefetch_task.done():
+            # Prefetch already talking to Deezer: wait for it instead of a second request
+            await asyncio.wait([self._prefetch_task])
+        track, self._next_track = self._next_track, None
+        self._prefetch_task = None
+        if self.rounds_loaded > 0:
+            # A hit means the preview itself is on disk, not just that a track was picked
+            round_stats.record_prefetch(track is not None and preview_cache.cached(track.get("id")))
+        if track is None:
+            track = await self._pick_track()
+        return track
+
+    async def _load_and_send_song(self):
+        """Load a random song from selected genres and broadcast to all players."""
+        started = time.perf_counter()
+        track = await self._take_next_track()
+        if not track:
             await self.broadcast({"type": "error", "message": "No hay canciones disponibles"})
             self.state = self.LOBBY
             return
 
-        track = random.choice(tracks)
         self.current_song = track
         self.stopper_id = None
+        self.response_ms = None
+        _prefetch_track(track)
 
         await self.broadcast({
             "type": "game_start",
-            "previewUrl": track["preview_url"],
+            "previewUrl": _preview_path(track),
         })
+        self.round_started_at = time.time()
+        if self.rounds_loaded > 0:
+            round_stats.record_gap(time.perf_counter() - started)
+        self.rounds_loaded += 1
+
+        # Choose the next round's song now so it is ready when this round ends
+        self._start_prefetch()
 
         # Start 30s play timer (backend safety net)
-        self._cancel_play_timer()
-        self._play_timer = asyncio.create_task(self._play_timeout())
+        self._start_play_timer()
 
     async def player_stop(self, user_id: int):
         if self.state != self.PLAYING:
@@ -310,6 +600,7 @@ class RoomState:
         self._cancel_play_timer()
         self.state = self.THINKING
         self.stopper_id = user_id
+        self.response_ms = int((time.time() - self.round_started_at) * 1000)
         pc.has_stopped = True
 
         # Notify everyone that someone stopped
@@ -320,8 +611,7 @@ class RoomState:
         })
 
         # Start 10s think timer
-        self._cancel_think_timer()
-        self._think_timer = asyncio.create_task(self._think_timeout())
+        self._start_think_timer()
 
     async def player_keep_listening(self, user_id: int):
         if self.state != self.THINKING or self.stopper_id != user_id:
@@ -343,14 +633,14 @@ class RoomState:
         })
 
         # Restart play timer with remaining time (simplified: restart full)
-        self._cancel_play_timer()
-        self._play_timer = asyncio.create_task(self._play_timeout())
+        self._start_play_timer()
 
     async def player_give_up(self, user_id: int):
         if self.state != self.THINKING or self.stopper_id != user_id:
             return
 
         self._cancel_think_timer()
+        self._record_round(None)
         self.state = self.ROUND_END
         song = self._song_info()
         await self.broadcast({
@@ -372,6 +662,8 @@ class RoomState:
     async def back_to_lobby(self):
         self._cancel_think_timer()
         self._cancel_play_timer()
+        self._finish_game()
+        self._cancel_prefetch()
         self.state = self.LOBBY
         self.current_song = None
         self.stopper_id = None
@@ -383,10 +675,20 @@ class RoomState:
 
     # ── Timers ──
 
-    async def _think_timeout(self):
+    def _start_play_timer(self, delay: float = PLAY_SECONDS):
+        self._cancel_play_timer()
+        self.play_deadline = time.time() + delay
+        self._play_timer = asyncio.create_task(self._play_timeout(delay))
+
+    def _start_think_timer(self, delay: float = THINK_SECONDS):
+        self._cancel_think_timer()
+        self.think_deadline = time.time() + delay
+        self._think_timer = asyncio.create_task(self._think_timeout(delay))
+
+    async def _think_timeout(self, delay: float):
         """10s thinking timer. If it expires, the stopper guessed correctly."""
         try:
-            await asyncio.sleep(10)
+            await asyncio.sleep(delay)
         except asyncio.CancelledError:
             return
 
@@ -395,6 +697,7 @@ class RoomState:
             return
 
         pc.score += 1
+        self._record_round(pc.user_id)
         self.state = self.ROUND_END
         song = self._song_info()
         await self.broadcast({
@@ -405,16 +708,17 @@ class RoomState:
             "scores": self._scores_list(),
         })
 
-    async def _play_timeout(self):
+    async def _play_timeout(self, delay: float):
         """30s play timer. If nobody stops, reveal song automatically."""
         try:
-            await asyncio.sleep(30)
+            await asyncio.sleep(delay)
         except asyncio.CancelledError:
             return
 
         if self.state != self.PLAYING:
             return
 
+        self._record_round(None)
         self.state = self.ROUND_END
         song = self._song_info()
         await self.broadcast({
@@ -433,6 +737,144 @@ class RoomState:
             self._play_timer.cancel()
         self._play_timer = None
 
+    # ── Results ──
+
+    def _record_round(self, winner_id: int | None):
+        if self.game_record is not None:
+            response_ms = self.response_ms if winner_id is not None else None
+            self.game_record.add_round(self.current_song, winner_id, response_ms)
+
+    def _finish_game(self):
+        if self.game_record is not None:
+            record_game(self.game_record)
+            self.game_record = None
+
+    # ── Snapshot / restore ──
+
+    def snapshot(self) -> dict:
+        return {
+            "room_id": self.room_id,
+            "creator_id": self.creator_id,
+            "creator_username": self.creator_username,
+            "invited_ids": sorted(self.invited_ids),
+            "created_at": self.created_at,
+            "state": self._state,
+            "players": [
+                [pc.user_id, pc.username, pc.role, pc.score, pc.can_stop, pc.has_stopped]
+                for pc in self.players.values()
+            ],
+            "current_song": self.current_song,
+            "stopper_id": self.stopper_id,
+            "selected_genres": self.selected_genres,
+            "round_started_at": self.round_started_at,
+            "response_ms": self.response_ms,
+            "play_deadline": self.play_deadline if _running(self._play_timer) else 0,
+            "think_deadline": self.think_deadline if _running(self._think_timer) else 0,
+            "game_record": self.game_record.to_dict() if self.game_record else None,
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "RoomState":
+        room = cls(data["room_id"], data["creator_id"], data["creator_username"], set(data["invited_ids"]))
+        room.created_at = data["created_at"]
+        room._state = data["state"]
+        for user_id, username, role, score, can_stop, has_stopped in data["players"]:
+            pc = PlayerConnection(None, user_id, username, role)
+            pc.score = score
+            pc.can_stop = can_stop
+            pc.has_stopped = has_stopped
+            room.players[user_id] = pc
+        room.current_song = data["current_song"]
+        song = room.current_song or {}
+        if song.get("id") and song.get("preview_url"):
+            preview_cache.remember(song["id"], song["preview_url"])
+        room.stopper_id = data["stopper_id"]
+        room.selected_genres = data["selected_genres"]
+        room.round_started_at = data["round_started_at"]
+        room.response_ms = data["response_ms"]
+        if data["game_record"]:
+            room.game_record = GameRecord.from_dict(room.room_id, room.creator_id, data["game_record"])
+        return room
+
+    def resume_timers(self, play_deadline: float, think_deadline: float):
+        """Restart timers that were running when the snapshot was taken."""
+        now = time.time()
+        if self._state == self.PLAYING and play_deadline:
+            self._start_play_timer(max(0, play_deadline - now))
+        elif self._state == self.THINKING and think_deadline:
+            self._start_think_timer(max(0, think_deadline - now))
+
+    async def attach(self, pc: PlayerConnection, ws: WebSocket, compact: bool = False):
+        """Re-attach a reconnecting player to their existing slot.
+
+        Messages buffered while detached are replayed in order (unless the
+        ring overflowed), followed by a resync with the authoritative state
+        and timer so the client can resume instead of starting over.
+        """
+        if pc.grace_task and not pc.grace_task.done():
+            pc.grace_task.cancel()
+        pc.grace_task = None
+        old_ws, pc.ws = pc.ws, ws
+        pc.compact = compact
+        # The new connection starts without a player list
+        pc.players_delta.reset()
+        if old_ws is not None:
+            # Same user from a new connection: the newer one wins
+            try:
+                await old_ws.close()
+            except Exception:
+                pass
+        # Compact scores frames carry only ids, so the client needs the
+        # names before anything replayed or the resync refers to them
+        await pc.send(self._players_message())
+
+        if not pc.buffer_overflowed:
+            for msg in pc.buffer:
+                await pc.send(msg)
+        pc.buffer.clear()
+        pc.buffer_overflowed = False
+
+        await pc.send({
+            "type": "resync",
+            "state": self._state,
+            "previewUrl": _preview_path(self.current_song) if self.current_song else None,
+            "remainingMs": self._remaining_ms(),
+            "canStop": pc.can_stop,
+            "stopperId": self.stopper_id,
+            "scores": self._scores_list(),
+            "song": self._song_info() if self._state == self.ROUND_END else None,
+        })
+        await self.broadcast_player_list()
+
+    def spectator_view(self) -> dict:
+        """Latest room state for spectators; built only when their flusher runs."""
+        return {
+            "type": "spectate",
+            "state": self._state,
+            "players": [
+                {
+                    "id": pc.user_id,
+                    "username": pc.username,
+                    "score": pc.score,
+                    "canStop": pc.can_stop,
+                    "connected": pc.attached,
+                }
+                for pc in self.players.values()
+            ],
+            "stopperId": self.stopper_id,
+            "previewUrl": _preview_path(self.current_song) if self.current_song and self._state != self.LOBBY else None,
+            "remainingMs": self._remaining_ms(),
+            "song": self._song_info() if self._state == self.ROUND_END else None,
+        }
+
+    def _remaining_ms(self) -> int | None:
+        now = time.time()
+        if self._state == self.PLAYING and _running(self._play_timer):
+            return max(0, int((self.play_deadline - now) * 1000))
+        if self._state == self.THINKING and _running(self._think_timer):
+            return max(0, int((self.think_deadline - now) * 1000))
+        return None
+
     # ── Helpers ──
 
     def _song_info(self) -> dict:
@@ -455,23 +897,218 @@ class RoomState:
     def _reset(self):
         self._cancel_think_timer()
         self._cancel_play_timer()
+        self._finish_game()
         self.state = self.LOBBY
         self.players.clear()
         self.current_song = None
         self.stopper_id = None
         self.selected_genres = []
+        self._cancel_prefetch()
+
+
+ROOM_TTL = 1800  # 30 minutes
+ROOM_RECHECK_INTERVAL = 60  # Re-check occupied rooms every minute
+
+
+class RoomRegistry:
+    """Active rooms indexed by member (creator or invitee), with an expiry heap.
+
+    Listing a user's rooms costs O(rooms of that user) and cleanup only pops
+    the heap entries whose deadline already passed.
+    """
+
+    def __init__(self):
+        self._rooms: dict[str, RoomState] = {}
+        self._by_user: dict[int, set[str]] = {}
+        self._expiry: list[tuple[float, str]] = []
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._rooms
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def get(self, room_id: str) -> "RoomState | None":
+        return self._rooms.get(room_id)
+
+    def values(self):
+        return self._rooms.values()
+
+    def add(self, room: RoomState):
+        self._rooms[room.room_id] = room
+        for uid in room.member_ids():
+            self._by_user.setdefault(uid, set()).add(room.room_id)
+        heapq.heappush(self._expiry, (room.created_at + ROOM_TTL, room.room_id))
+        hub.publish(room.member_ids(), {"type": "room_created", "room": room.summary()})
+
+    def pop(self, room_id: str, default=None):
+        room = self._rooms.pop(room_id, None)
+        if room is None:
+            return default
+        for uid in room.member_ids():
+            ids = self._by_user.get(uid)
+            if ids is not None:
+                ids.discard(room_id)
+                if not ids:
+                    del self._by_user[uid]
+        # Heap entries of removed rooms are discarded lazily in cleanup()
+        hub.publish(room.member_ids(), {"type": "room_removed", "roomId": room_id})
+        return room
+
+    def remove_member(self, room: RoomState, user_id: int):
+        """Un-invite a user from a room that stays open."""
+        room.invited_ids.discard(user_id)
+        ids = self._by_user.get(user_id)
+        if ids is not None:
+            ids.discard(room.room_id)
+            if not ids:
+                del self._by_user[user_id]
+
+    def for_user(self, user_id: int) -> list[RoomState]:
+        ids = self._by_user.get(user_id, ())
+        return sorted((self._rooms[rid] for rid in ids), key=lambda r: r.created_at)
+
+    def cleanup(self):
+        """Remove stale empty rooms older than ROOM_TTL."""
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, rid = heapq.heappop(self._expiry)
+            room = self._rooms.get(rid)
+            if room is None:
+                continue
+            if room.players:
+                heapq.heappush(self._expiry, (now + ROOM_RECHECK_INTERVAL, rid))
+            else:
+                self.pop(rid)
+                room.spectators.close({"type": "room_closed", "message": "La sala se cerró"})
 
 
 # Multi-room store
-rooms: dict[str, RoomState] = {}
+rooms = RoomRegistry()
 
 
 def _cleanup_rooms():
-    """Remove stale empty rooms older than 30 minutes."""
-    now = time.time()
-    expired = [rid for rid, r in rooms.items() if not r.players and now - r.created_at > 1800]
-    for rid in expired:
-        del rooms[rid]
+    rooms.cleanup()
+
+
+async def evict_user(user_id: int):
+    """Close the rooms a deleted user created and drop them from the others.
+
+    The user is scrubbed from each running game record first, so the result
+    written when a room resets carries no rows pointing at them.
+    """
+    for room in rooms.for_user(user_id):
+        if room.game_record is not None:
+            room.game_record.drop_player(user_id)
+        if room.creator_id == user_id:
+            await room.broadcast({"type": "room_closed", "message": "La sala se cerró"})
+            room._reset()
+            rooms.pop(room.room_id, None)
+            room.spectators.close({"type": "room_closed", "message": "La sala se cerró"})
+            continue
+        rooms.remove_member(room, user_id)
+        pc = room.players.get(user_id)
+        if pc is None:
+            room._publish_summary()
+            continue
+        ws = pc.ws
+        await room.remove_player(user_id, ws)
+        if ws is not None:
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+
+# ── Room snapshots (survive restarts / deploys) ──
+
+ROOM_SNAPSHOT_PATH = os.getenv("ROOM_SNAPSHOT_PATH") or os.path.join(tempfile.gettempdir(), "oido_rooms.json.gz")
+ROOM_SNAPSHOT_INTERVAL = 30
+RESTORE_GRACE = 60  # Seconds restored players have to reconnect
+ROOM_SNAPSHOT_MAX_AGE = 300  # Older snapshots describe games nobody is waiting on
+_snapshot_frozen = False
+
+
+def _rooms_snapshot_json() -> str:
+    """Serialize every active room; call on the event loop, which owns the room state."""
+    data = {"saved_at": time.time(), "rooms": [r.snapshot() for r in rooms.values()]}
+    return json.dumps(data, separators=(",", ":"))
+
+
+def _write_rooms_snapshot(text: str):
+    """Gzip to a temp file and rename it over ROOM_SNAPSHOT_PATH; safe off the loop."""
+    tmp = ROOM_SNAPSHOT_PATH + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, ROOM_SNAPSHOT_PATH)
+
+
+def save_rooms_snapshot():
+    """Write every active room to ROOM_SNAPSHOT_PATH (gzipped JSON, atomic rename)."""
+    _write_rooms_snapshot(_rooms_snapshot_json())
+
+
+def restore_rooms_snapshot():
+    """Restore rooms from a recent snapshot, then remove the file.
+
+    Removing it means a process that keeps crashing on startup does not
+    resurrect the same rooms over and over; the periodic snapshot writes a
+    fresh one once the server is up.
+    """
+    try:
+        with gzip.open(ROOM_SNAPSHOT_PATH, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    try:
+        os.remove(ROOM_SNAPSHOT_PATH)
+    except OSError:
+        pass
+    if time.time() - data.get("saved_at", 0) > ROOM_SNAPSHOT_MAX_AGE:
+        return
+    for item in data.get("rooms", []):
+        if item["room_id"] in rooms:
+            continue
+        room = RoomState.from_snapshot(item)
+        rooms.add(room)
+        room.resume_timers(item["play_deadline"], item["think_deadline"])
+        for pc in room.players.values():
+            room._start_grace(pc, RESTORE_GRACE)
+
+
+async def _snapshot_forever():
+    while True:
+        await asyncio.sleep(ROOM_SNAPSHOT_INTERVAL)
+        if _snapshot_frozen:
+            return
+        try:
+            # Serialized here so the rooms cannot change mid-snapshot; only the I/O is threaded
+            text = _rooms_snapshot_json()
+            await asyncio.to_thread(_write_rooms_snapshot, text)
+        except Exception:
+            logger.exception("Room snapshot failed")
+
+
+def _install_sigterm_snapshot():
+    """Snapshot on SIGTERM before uvicorn closes the sockets and empties the rooms."""
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handler(signum, frame):
+        global _snapshot_frozen
+        if not _snapshot_frozen:
+            _snapshot_frozen = True
+            try:
+                save_rooms_snapshot()
+            except Exception:
+                logger.exception("Room snapshot on SIGTERM failed")
+        if callable(previous):
+            previous(signum, frame)
+
+    try:
+        signal.signal(signal.SIGTERM, handler)
+    except ValueError:
+        # Not in the main thread (e.g. some test runners): periodic snapshots still run
+        pass
 
 
 # ── REST endpoints for room management ──
@@ -480,60 +1117,62 @@ class CreateRoomBody(BaseModel):
     invited_ids: list[int]
 
 
-@router.post("/rooms")
-def create_room(body: CreateRoomBody, user: dict = Depends(get_current_user)):
-    _cleanup_rooms()
-
-    if not body.invited_ids:
-        raise HTTPException(status_code=400, detail="Debes invitar al menos un amigo")
-
-    # Validate all invited_ids are accepted friends
+def _accepted_friends(user_id: int, friend_ids: list[int]) -> set[int]:
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        placeholders = ",".join(["%s"] * len(body.invited_ids))
+        placeholders = ",".join(["%s"] * len(friend_ids))
         cursor.execute(
             f"""SELECT CASE WHEN sender_id = %s THEN receiver_id ELSE sender_id END AS friend_id
                 FROM friendships
                 WHERE status = 'accepted'
                   AND ((sender_id = %s AND receiver_id IN ({placeholders}))
                     OR (receiver_id = %s AND sender_id IN ({placeholders})))""",
-            [user["id"], user["id"]] + body.invited_ids + [user["id"]] + body.invited_ids,
+            [user_id, user_id] + friend_ids + [user_id] + friend_ids,
         )
-        valid_friend_ids = {row["friend_id"] for row in cursor.fetchall()}
-        invalid = set(body.invited_ids) - valid_friend_ids
-        if invalid:
-            raise HTTPException(status_code=400, detail="Algunos usuarios no son tus amigos")
+        return {row["friend_id"] for row in cursor.fetchall()}
     finally:
         cursor.close()
         conn.close()
 
+
+# Room endpoints are async so the registry (and the spectator tasks that
+# cleanup closes) are only ever touched from the event loop
+@router.post("/rooms")
+async def create_room(body: CreateRoomBody, user: dict = Depends(get_current_user)):
+    _cleanup_rooms()
+
+    if not body.invited_ids:
+        raise HTTPException(status_code=400, detail="Debes invitar al menos un amigo")
+    if len(set(body.invited_ids)) >= MAX_PLAYERS_PER_ROOM:
+        raise HTTPException(status_code=400, detail=f"Puedes invitar como máximo a {MAX_PLAYERS_PER_ROOM - 1} amigos")
+
+    # Validate all invited_ids are accepted friends
+    valid_friend_ids = await asyncio.to_thread(_accepted_friends, user["id"], body.invited_ids)
+    invalid = set(body.invited_ids) - valid_friend_ids
+    if invalid:
+        raise HTTPException(status_code=400, detail="Algunos usuarios no son tus amigos")
+
+    # Counted after the query so concurrent requests cannot both pass the limit
+    own_rooms = sum(1 for r in rooms.for_user(user["id"]) if r.creator_id == user["id"])
+    if own_rooms >= MAX_ROOMS_PER_CREATOR:
+        raise HTTPException(status_code=429, detail=f"Ya tienes {own_rooms} salas abiertas, cierra alguna para crear otra")
+
     room_id = secrets.token_urlsafe(6)
     while room_id in rooms:
         room_id = secrets.token_urlsafe(6)
 
     invited_set = set(body.invited_ids)
     new_room = RoomState(room_id, user["id"], user["username"], invited_set)
-    rooms[room_id] = new_room
+    rooms.add(new_room)
 
     return {"roomId": room_id, "invitedCount": len(invited_set)}
 
 
 @router.get("/rooms")
-def get_my_rooms(user: dict = Depends(get_current_user)):
+async def get_my_rooms(user: dict = Depends(get_current_user)):
     _cleanup_rooms()
-    result = []
-    for r in rooms.values():
-        if r.creator_id == user["id"] or user["id"] in r.invited_ids:
-            result.append({
-                "roomId": r.room_id,
-                "creatorUsername": r.creator_username,
-                "creatorId": r.creator_id,
-                "playerCount": len(r.players),
-                "state": r.state,
-                "createdAt": r.created_at,
-            })
-    return result
+    return [r.summary() for r in rooms.for_user(user["id"])]
 
 
 @router.delete("/rooms/{room_id}")
@@ -548,6 +1187,7 @@ async def close_room(room_id: str, user: dict = Depends(get_current_user)):
     await current_room.broadcast({"type": "room_closed", "message": "El creador cerró la sala"})
     current_room._reset()
     rooms.pop(room_id, None)
+    current_room.spectators.close({"type": "room_closed", "message": "El creador cerró la sala"})
     return {"message": "Sala cerrada"}
 
 
@@ -587,51 +1227,119 @@ async def game_ws(ws: WebSocket, room_id: str):
         await ws.close()
         return
 
-    pc = PlayerConnection(ws, user["id"], user["username"], user["role"])
+    compact = ws.query_params.get("proto") == "compact"
 
     # Send current state before adding
-    await ws.send_json({"type": "state", "state": current_room.state})
+    state_msg = {"type": "state", "state": current_room.state}
+    await ws.send_text(protocol.dumps(protocol.encode(state_msg) if compact else state_msg))
+
+    existing = current_room.players.get(user["id"])
+    if existing is not None:
+        pc = existing
+        await current_room.attach(pc, ws, compact)
+    else:
+        pc = PlayerConnection(ws, user["id"], user["username"], user["role"], compact)
+        added = await current_room.add_player(pc)
+        if not added:
+            return
 
-    added = await current_room.add_player(pc)
-    if not added:
-        return
+    async with SupervisedConnection(ws) as sup:
+        try:
+            while True:
+                data = await ws.receive_json()
+                sup.seen()
+                msg_type = data.get("type")
+
+                # Pongs are charged too, or they could be flooded for free
+                if not sup.allow():
+                    if sup.abusive:
+                        await sup.close_abusive()
+                        break
+                    continue
+                if msg_type == "pong":
+                    continue
 
-    try:
-        while True:
-            data = await ws.receive_json()
-            msg_type = data.get("type")
+                if msg_type == "start":
+                    if pc.user_id != current_room.creator_id:
+                        await pc.send({"type": "error", "message": "Solo el creador puede iniciar la partida"})
+                        continue
+                    genres = data.get("genres", [])
+                    await current_room.start_game(genres, bool(data.get("popularityBias", False)))
 
-            if msg_type == "start":
-                if pc.user_id != current_room.creator_id:
-                    await ws.send_json({"type": "error", "message": "Solo el creador puede iniciar la partida"})
-                    continue
-                genres = data.get("genres", [])
-                await current_room.start_game(genres)
+                elif msg_type == "stop":
+                    await current_room.player_stop(pc.user_id)
 
-            elif msg_type == "stop":
-                await current_room.player_stop(pc.user_id)
+                elif msg_type == "keep_listening":
+                    await current_room.player_keep_listening(pc.user_id)
 
-            elif msg_type == "keep_listening":
-                await current_room.player_keep_listening(pc.user_id)
+                elif msg_type == "give_up":
+                    await current_room.player_give_up(pc.user_id)
 
-            elif msg_type == "give_up":
-                await current_room.player_give_up(pc.user_id)
+                elif msg_type == "next_round":
+                    if pc.user_id != current_room.creator_id:
+                        await pc.send({"type": "error", "message": "Solo el creador puede avanzar de ronda"})
+                        continue
+                    await current_room.next_round()
 
-            elif msg_type == "next_round":
-                if pc.user_id != current_room.creator_id:
-                    await ws.send_json({"type": "error", "message": "Solo el creador puede avanzar de ronda"})
-                    continue
-                await current_room.next_round()
+                elif msg_type == "back_to_lobby":
+                    if pc.user_id != current_room.creator_id:
+                        await pc.send({"type": "error", "message": "Solo el creador puede volver al lobby"})
+                        continue
+                    await current_room.back_to_lobby()
 
-            elif msg_type == "back_to_lobby":
-                if pc.user_id != current_room.creator_id:
-                    await ws.send_json({"type": "error", "message": "Solo el creador puede volver al lobby"})
-                    continue
-                await current_room.back_to_lobby()
+        except WebSocketDisconnect:
+            pass
+        except Exception:
+            pass
+        finally:
+            await current_room.detach(pc.user_id, ws)
 
-    except WebSocketDisconnect:
-        pass
-    except Exception:
-        pass
-    finally:
-        await current_room.remove_player(pc.user_id, ws)
+
+@router.websocket("/ws/{room_id}/watch")
+async def spectate_ws(ws: WebSocket, room_id: str):
+    """Read-only view of a room for members and friends of the creator, in any state."""
+    await ws.accept()
+
+    token = ws.query_params.get("token")
+    user = _authenticate_ws(token) if token else None
+    if not user:
+        await ws.send_json({"type": "error", "message": "Token inválido o expirado"})
+        await ws.close()
+        return
+
+    current_room = rooms.get(room_id)
+    if not current_room:
+        await ws.send_json({"type": "error", "message": "Sala no encontrada"})
+        await ws.close()
+        return
+
+    allowed = user["id"] in current_room.member_ids() or user["role"] == "admin"
+    if not allowed:
+        creator_friends = await asyncio.to_thread(friend_graph.friends, current_room.creator_id)
+        allowed = user["id"] in creator_friends
+    if not allowed:
+        await ws.send_json({"type": "error", "message": "No tienes acceso a esta sala"})
+        await ws.close()
+        return
+
+    if current_room.spectators.full:
+        await ws.send_json({"type": "error", "message": "La sala tiene demasiados espectadores"})
+        await ws.close()
+        return
+
+    current_room.spectators.add(ws)
+    async with SupervisedConnection(ws) as sup:
+        try:
+            # Spectators cannot act on the room; incoming messages are just pongs
+            while True:
+                await ws.receive_text()
+                sup.seen()
+                if not sup.allow() and sup.abusive:
+                    await sup.close_abusive()
+                    break
+        except WebSocketDisconnect:
+            pass
+        except Exception:
+            pass
+        finally:
+            current_room.spectators.remove(ws)
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from auth import JWT_SECRET
+
+load_dotenv()
+
+SESSION_TTL = 300  # 5 minutes
+SESSION_MAX = int(os.getenv("GAME_SESSION_MAX", "10000"))
+SESSION_SWEEP_INTERVAL = 60
+# "memory" keeps sessions server-side, "stateless" hands the song back to the
+# client inside an encrypted token so the server keeps nothing.
+SESSION_MODE = os.getenv("GAME_SESSION_MODE", "memory").lower()
+
+
+class SessionStore:
+    """Solo game sessions ordered by creation time.
+
+    Every session has the same TTL, so insertion order is also expiry order:
+    expired entries are always at the front of the OrderedDict and both
+    cleanup and capacity eviction pop from there in O(1) per entry.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL, max_size: int = SESSION_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def create(self, song: dict) -> str:
+        token = secrets.token_urlsafe(32)
+        self._data[token] = (time.time(), song)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        return token
+
+    def pop(self, token: str) -> dict | None:
+        entry = self._data.pop(token, None)
+        if entry is None:
+            return None
+        created_at, song = entry
+        if time.time() - created_at > self.ttl:
+            return None
+        return song
+
+    def cleanup(self) -> int:
+        cutoff = time.time() - self.ttl
+        removed = 0
+        while self._data:
+            created_at = next(iter(self._data.values()))[0]
+            if created_at > cutoff:
+                break
+            self._data.popitem(last=False)
+            removed += 1
+        return removed
+
+    async def sweep_forever(self, interval: int = SESSION_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.cleanup()
+
+
+class StatelessSessionCodec:
+    """Encrypts the session payload into the token itself (Fernet: AES + HMAC)."""
+
+    def __init__(self, secret: str = JWT_SECRET, ttl: int = SESSION_TTL):
+        from cryptography.fernet import Fernet
+
+        key = base64.urlsafe_b64encode(hashlib.sha256(f"game-session:{secret}".encode()).digest())
+        self._fernet = Fernet(key)
+        self.ttl = ttl
+
+    def create(self, song: dict) -> str:
+        return self._fernet.encrypt(json.dumps(song, separators=(",", ":")).encode()).decode()
+
+    def pop(self, token: str) -> dict | None:
+        from cryptography.fernet import InvalidToken
+
+        try:
+            return json.loads(self._fernet.decrypt(token.encode(), ttl=self.ttl))
+        except (InvalidToken, ValueError):
+            return None
+
+    def cleanup(self) -> int:
+        return 0
+
+    async def sweep_forever(self, interval: int = SESSION_SWEEP_INTERVAL):
+        return
+
+
+sessions = StatelessSessionCodec() if SESSION_MODE == "stateless" else SessionStore()
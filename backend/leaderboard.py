@@ -0,0 +1,464 @@
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query
+
+from database import get_connection
+from auth import get_current_user
+from friends import friend_graph
+
+router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+
+logger = logging.getLogger("oido.leaderboard")
+
+WRITER_BATCH_SIZE = 50
+WRITER_FLUSH_INTERVAL = 2  # seconds
+FRIEND_VIEW_TTL = 600  # 10 minutes
+FRIEND_VIEW_MAX = 5000
+
+
+class Leaderboard:
+    """Scores kept sorted in memory so the top k is a slice, not a query.
+
+    Entries are (-score, user_id) tuples in a sorted list; updating a score
+    removes the old tuple and inserts the new one by bisection.
+    """
+
+    def __init__(self):
+        self._scores: dict[int, int] = {}
+        self._sorted: list[tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def score(self, user_id: int) -> int | None:
+        return self._scores.get(user_id)
+
+    def set(self, user_id: int, score: int):
+        old = self._scores.get(user_id)
+        if old is not None:
+            i = bisect_left(self._sorted, (-old, user_id))
+            del self._sorted[i]
+        self._scores[user_id] = score
+        insort(self._sorted, (-score, user_id))
+
+    def add(self, user_id: int, delta: int):
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def remove(self, user_id: int):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            i = bisect_left(self._sorted, (-old, user_id))
+            del self._sorted[i]
+
+    def top(self, k: int) -> list[tuple[int, int]]:
+        return [(uid, -neg) for neg, uid in self._sorted[:k]]
+
+    def rank(self, user_id: int) -> int | None:
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._sorted, (-score, user_id)) + 1
+
+
+global_board = Leaderboard()
+genre_boards: dict[int, Leaderboard] = {}
+_stats: dict[int, dict] = {}  # user_id -> {"games": int, "wins": int}
+
+
+class FriendRankViews:
+    """Per-user ranking of that user and their friends, kept up to date.
+
+    A view is built once from the cached friend graph and the global scores,
+    then patched in place when a member's score or a friendship changes, so
+    reading it never touches MySQL. Views expire after FRIEND_VIEW_TTL.
+
+    Views are read from threadpool endpoints and patched from the event
+    loop (game results), so all state is guarded by one lock and readers get
+    a ranking snapshot rather than the live view.
+    """
+
+    def __init__(self, ttl: int = FRIEND_VIEW_TTL, max_views: int = FRIEND_VIEW_MAX):
+        self.ttl = ttl
+        self.max_views = max_views
+        self._views: OrderedDict[int, tuple[float, Leaderboard]] = OrderedDict()
+        self._watchers: dict[int, set[int]] = {}  # member -> owners whose view includes it
+        self._lock = threading.Lock()
+
+    def ranking(self, owner: int) -> list[tuple[int, int]]:
+        """(user_id, score) pairs of the owner and their friends, best first."""
+        with self._lock:
+            entry = self._views.get(owner)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self._views.move_to_end(owner)
+                return entry[1].top(len(entry[1]))
+            if entry is not None:
+                self._drop(owner)
+
+        # May hit MySQL: load the friend list before taking the lock
+        members = [owner, *friend_graph.friends(owner)]
+        with self._lock:
+            # Another thread may have built the view meanwhile; replace it
+            self._drop(owner)
+            view = Leaderboard()
+            for uid in members:
+                view.set(uid, global_board.score(uid) or 0)
+                self._watchers.setdefault(uid, set()).add(owner)
+            self._views[owner] = (time.time(), view)
+            while len(self._views) > self.max_views:
+                self._drop(next(iter(self._views)))
+            return view.top(len(view))
+
+    def _drop(self, owner: int):
+        entry = self._views.pop(owner, None)
+        if entry is None:
+            return
+        for uid, _ in entry[1].top(len(entry[1])):
+            owners = self._watchers.get(uid)
+            if owners is not None:
+                owners.discard(owner)
+                if not owners:
+                    del self._watchers[uid]
+
+    def on_score(self, user_id: int, score: int):
+        with self._lock:
+            for owner in self._watchers.get(user_id, ()):
+                entry = self._views.get(owner)
+                if entry is not None:
+                    entry[1].set(user_id, score)
+
+    def on_friendship(self, kind: str, a: int, b: int):
+        with self._lock:
+            for owner, other in ((a, b), (b, a)):
+                entry = self._views.get(owner)
+                if entry is None:
+                    continue
+                if kind == "added":
+                    entry[1].set(other, global_board.score(other) or 0)
+                    self._watchers.setdefault(other, set()).add(owner)
+                else:
+                    entry[1].remove(other)
+                    self._watchers.get(other, set()).discard(owner)
+
+    def forget(self, user_id: int):
+        with self._lock:
+            self._drop(user_id)
+            for owner in self._watchers.pop(user_id, set()):
+                entry = self._views.get(owner)
+                if entry is not None:
+                    entry[1].remove(user_id)
+
+
+friend_views = FriendRankViews()
+friend_graph.on_change(friend_views.on_friendship)
+
+
+def forget_user(user_id: int):
+    """Drop a deleted user from every in-memory board."""
+    global_board.remove(user_id)
+    for board in genre_boards.values():
+        board.remove(user_id)
+    _stats.pop(user_id, None)
+    friend_views.forget(user_id)
+
+
+def load_leaderboards():
+    """Rebuild the in-memory boards from the running totals in MySQL."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Users whose deletion is still being purged stay off the boards
+        cursor.execute(
+            "SELECT s.user_id, s.total_score, s.games_played, s.wins FROM player_scores s "
+            "JOIN users u ON u.id = s.user_id WHERE u.deleted_at IS NULL"
+        )
+        for r in cursor.fetchall():
+            global_board.set(r["user_id"], r["total_score"])
+            _stats[r["user_id"]] = {"games": r["games_played"], "wins": r["wins"]}
+        cursor.execute(
+            "SELECT g.user_id, g.genre_id, g.score FROM player_genre_scores g "
+            "JOIN users u ON u.id = g.user_id WHERE u.deleted_at IS NULL"
+        )
+        for r in cursor.fetchall():
+            genre_boards.setdefault(r["genre_id"], Leaderboard()).set(r["user_id"], r["score"])
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ── Game results ──
+
+class GameRecord:
+    """Result of one game, from start to back-to-lobby or room close."""
+
+    def __init__(self, room_id: str, creator_id: int, player_ids):
+        self.room_id = room_id
+        self.creator_id = creator_id
+        self.started_at = time.time()
+        self.rounds: list[dict] = []
+        # Kept here so players who leave mid-game still get their points
+        self.scores: dict[int, int] = {uid: 0 for uid in player_ids}
+
+    def add_round(self, song: dict | None, winner_id: int | None, response_ms: int | None):
+        song = song or {}
+        if winner_id is not None:
+            self.scores[winner_id] = self.scores.get(winner_id, 0) + 1
+        self.rounds.append({
+            "genre_id": song.get("genre_id", 0),
+            "title": song.get("title", ""),
+            "artist": song.get("artist", ""),
+            "winner_id": winner_id,
+            "response_ms": response_ms,
+        })
+
+    def drop_player(self, user_id: int):
+        """Remove a deleted user: their score, the rounds they won and their room credit."""
+        self.scores.pop(user_id, None)
+        for r in self.rounds:
+            if r["winner_id"] == user_id:
+                r["winner_id"] = None
+        if self.creator_id == user_id:
+            self.creator_id = None
+
+    def to_dict(self) -> dict:
+        return {"started_at": self.started_at, "rounds": self.rounds, "scores": list(self.scores.items())}
+
+    @classmethod
+    def from_dict(cls, room_id: str, creator_id: int, data: dict) -> "GameRecord":
+        record = cls(room_id, creator_id, ())
+        record.started_at = data["started_at"]
+        record.rounds = data["rounds"]
+        record.scores = {uid: score for uid, score in data["scores"]}
+        return record
+
+    def winner_id(self) -> int | None:
+        if not self.scores:
+            return None
+        best = max(self.scores.values())
+        leaders = [uid for uid, score in self.scores.items() if score == best]
+        return leaders[0] if best > 0 and len(leaders) == 1 else None
+
+
+class ResultWriter:
+    """Batches finished games and writes them to MySQL off the event loop.
+
+    The batch being collected lives on the writer, so flush() at shutdown
+    writes it along with whatever is still queued. A batch that fails is
+    retried one game at a time, so a bad record only loses itself.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[GameRecord] = asyncio.Queue()
+        self._batch: list[GameRecord] = []
+        # Records submitted / attempted so far, for settle()
+        self._submitted = 0
+        self._written = 0
+        self._progress = asyncio.Condition()
+
+    def submit(self, record: GameRecord):
+        self._submitted += 1
+        self._queue.put_nowait(record)
+
+    async def settle(self):
+        """Wait until every record submitted before this call has been written (or given up on)."""
+        target = self._submitted
+        async with self._progress:
+            await self._progress.wait_for(lambda: self._written >= target)
+
+    async def run_forever(self):
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = time.monotonic() + WRITER_FLUSH_INTERVAL
+            while len(self._batch) < WRITER_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            await self._write(batch)
+
+    async def flush(self):
+        batch, self._batch = self._batch, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    async def _write(self, batch: list[GameRecord]):
+        try:
+            await self._store(batch)
+        finally:
+            self._written += len(batch)
+            async with self._progress:
+                self._progress.notify_all()
+
+    async def _store(self, batch: list[GameRecord]):
+        try:
+            await asyncio.to_thread(_write_batch, batch)
+            return
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Failed to write game result for room %s", batch[0].room_id)
+                return
+            logger.warning("Game result batch of %d failed, retrying one by one", len(batch), exc_info=True)
+        for record in batch:
+            try:
+                await asyncio.to_thread(_write_batch, [record])
+            except Exception:
+                logger.exception("Failed to write game result for room %s", record.room_id)
+
+
+def _write_batch(batch: list[GameRecord]):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        for rec in batch:
+            cursor.execute(
+                "INSERT INTO game_results (room_id, creator_id, rounds, winner_id, started_at) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (rec.room_id, rec.creator_id, len(rec.rounds), rec.winner_id(), datetime.fromtimestamp(rec.started_at)),
+            )
+            game_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO game_rounds (game_id, round_no, genre_id, title, artist, winner_id, response_ms) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [
+                    (game_id, i + 1, r["genre_id"], r["title"], r["artist"], r["winner_id"], r["response_ms"])
+                    for i, r in enumerate(rec.rounds)
+                ],
+            )
+            cursor.executemany(
+                "INSERT INTO game_players (game_id, user_id, score) VALUES (%s, %s, %s)",
+                [(game_id, uid, score) for uid, score in rec.scores.items()],
+            )
+            winner = rec.winner_id()
+            cursor.executemany(
+                "INSERT INTO player_scores (user_id, total_score, games_played, wins) VALUES (%s, %s, 1, %s) "
+                "ON DUPLICATE KEY UPDATE total_score = total_score + VALUES(total_score), "
+                "games_played = games_played + 1, wins = wins + VALUES(wins)",
+                [(uid, score, 1 if uid == winner else 0) for uid, score in rec.scores.items()],
+            )
+            genre_wins: dict[tuple[int, int], int] = {}
+            for r in rec.rounds:
+                if r["winner_id"] is not None:
+                    key = (r["winner_id"], r["genre_id"])
+                    genre_wins[key] = genre_wins.get(key, 0) + 1
+            if genre_wins:
+                cursor.executemany(
+                    "INSERT INTO player_genre_scores (user_id, genre_id, score) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE score = score + VALUES(score)",
+                    [(uid, gid, n) for (uid, gid), n in genre_wins.items()],
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+writer = ResultWriter()
+
+
+def record_game(record: GameRecord):
+    """Update the in-memory boards right away and queue the DB write."""
+    if not record.rounds:
+        return
+    winner = record.winner_id()
+    for uid, score in record.scores.items():
+        global_board.add(uid, score)
+        friend_views.on_score(uid, global_board.score(uid))
+        stats = _stats.setdefault(uid, {"games": 0, "wins": 0})
+        stats["games"] += 1
+        if uid == winner:
+            stats["wins"] += 1
+    for r in record.rounds:
+        if r["winner_id"] is not None:
+            genre_boards.setdefault(r["genre_id"], Leaderboard()).add(r["winner_id"], 1)
+    writer.submit(record)
+
+
+# ── Endpoints ──
+
+def _with_users(entries: list[tuple[int, int]]) -> list[dict]:
+    """Attach username/avatar to (user_id, score) pairs with one indexed lookup."""
+    if not entries:
+        return []
+    ids = [uid for uid, _ in entries]
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        placeholders = ",".join(["%s"] * len(ids))
+        cursor.execute(f"SELECT id, username, avatar FROM users WHERE id IN ({placeholders})", ids)
+        users = {r["id"]: r for r in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+    result = []
+    for uid, score in entries:
+        u = users.get(uid)
+        if not u:
+            continue
+        stats = _stats.get(uid, {"games": 0, "wins": 0})
+        result.append({
+            "rank": len(result) + 1,
+            "id": uid,
+            "username": u["username"],
+            "avatar": u.get("avatar", "default"),
+            "score": score,
+            "gamesPlayed": stats["games"],
+            "wins": stats["wins"],
+        })
+    return result
+
+
+@router.get("")
+def get_global_leaderboard(limit: int = Query(20, ge=1, le=100), user: dict = Depends(get_current_user)):
+    return _with_users(global_board.top(limit))
+
+
+@router.get("/genre/{genre_id}")
+def get_genre_leaderboard(genre_id: int, limit: int = Query(20, ge=1, le=100), user: dict = Depends(get_current_user)):
+    board = genre_boards.get(genre_id)
+    return _with_users(board.top(limit) if board else [])
+
+
+def _friend_ranking(owner: int) -> list[dict]:
+    ranking = friend_views.ranking(owner)
+    profiles = friend_graph.friends(owner)
+    profiles[owner] = friend_graph.profile(owner)
+    result = []
+    for uid, score in ranking:
+        p = profiles.get(uid)
+        if not p:
+            continue
+        stats = _stats.get(uid, {"games": 0, "wins": 0})
+        result.append({
+            "rank": len(result) + 1,
+            "id": uid,
+            "username": p["username"],
+            "avatar": p["avatar"],
+            "score": score,
+            "gamesPlayed": stats["games"],
+            "wins": stats["wins"],
+        })
+    return result
+
+
+@router.get("/friends")
+def get_friends_leaderboard(user: dict = Depends(get_current_user)):
+    return _friend_ranking(user["id"])
+
+
+@router.get("/users/{user_id}/friends")
+def get_user_friends_leaderboard(user_id: int, user: dict = Depends(get_current_user)):
+    return _friend_ranking(user_id)
@@ -1,5 +1,6 @@
 import os
 import json
+import asyncio
 import time
 import hashlib
 import hmac
@@ -8,17 +9,25 @@ import tempfile
 from pathlib import Path
 from urllib.parse import quote_plus
 
-import httpx
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from database import init_db, get_connection
-from auth import router as auth_router, get_current_user
+from auth import router as auth_router, get_current_user, load_deleted_users
 from history import router as history_router
 from admin import router as admin_router
-from game import router as game_router
+from game import router as game_router, start_background_tasks
 from social import router as social_router
+from notifications import router as notifications_router
+from leaderboard import router as leaderboard_router, load_leaderboards, writer as results_writer
+from metrics import router as metrics_router, MetricsMiddleware, http_client, monitor_loop_lag
+from querylog import QueryTraceMiddleware, QUERY_TRACE_MODE
+from profiler import watchdog
+from analytics import router as analytics_router, rollups
+from retention import router as retention_router, retention
+from bulk import router as bulk_router
+from deletion import router as deletion_router, deletions
 
 load_dotenv(override=True)
 
@@ -34,21 +43,51 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if QUERY_TRACE_MODE in ("log", "strict"):
+    app.add_middleware(QueryTraceMiddleware)
+# Outermost, so the timing covers CORS handling as well
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(history_router)
 app.include_router(admin_router)
 app.include_router(game_router)
 app.include_router(social_router)
+app.include_router(notifications_router)
+app.include_router(leaderboard_router)
+app.include_router(analytics_router)
+app.include_router(retention_router)
+app.include_router(bulk_router)
+app.include_router(deletion_router)
+app.include_router(metrics_router)
 
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    load_deleted_users()
+    load_leaderboards()
+
+
+@app.on_event("startup")
+async def on_startup_tasks():
+    start_background_tasks()
+    asyncio.create_task(results_writer.run_forever())
+    asyncio.create_task(monitor_loop_lag())
+    watchdog.start()
+    asyncio.create_task(rollups.run_forever())
+    asyncio.create_task(retention.run_forever())
+    asyncio.create_task(deletions.run_forever())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await results_writer.flush()
 
 ACR_ACCESS_KEY = os.getenv("ACR_ACCESS_KEY", "")
 ACR_ACCESS_SECRET = os.getenv("ACR_ACCESS_SECRET", "")
 ACR_HOST = os.getenv("ACR_HOST", "identify-us-west-2.acrcloud.com")
+ACR_BASE_URL = (os.getenv("ACR_BASE_URL") or f"https://{ACR_HOST}").rstrip("/")
 
 
 def build_signature(method, uri, access_key, data_type, signature_version, timestamp, access_secret):
@@ -63,6 +102,23 @@ def build_signature(method, uri, access_key, data_type, signature_version, times
     return sign
 
 
+def _log_searches(user_id: int, songs: list[dict]):
+    if not songs:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            "INSERT INTO search_log (user_id, title, artist, album, spotify_url, youtube_url, score) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [(user_id, s["title"], s["artist"], s["album"], s["spotifyUrl"], s["youtubeUrl"], s["score"]) for s in songs],
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -91,9 +147,9 @@ async def recognize_audio(audio: UploadFile = File(...), user: dict = Depends(ge
     files = {"sample": ("audio.webm", content, "audio/webm")}
 
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
+        async with http_client(timeout=15) as client:
             response = await client.post(
-                f"https://{ACR_HOST}/v1/identify",
+                f"{ACR_BASE_URL}/v1/identify",
                 data=data,
                 files=files,
             )
@@ -144,19 +200,9 @@ async def recognize_audio(audio: UploadFile = File(...), user: dict = Depends(ge
             "youtubeUrl": youtube_url,
         })
 
-    # Log all results to search_log
+    # Log all results to search_log, off the event loop
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        for s in songs:
-            cursor.execute(
-                "INSERT INTO search_log (user_id, title, artist, album, spotify_url, youtube_url, score) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (user["id"], s["title"], s["artist"], s["album"], s["spotifyUrl"], s["youtubeUrl"], s["score"]),
-            )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        await asyncio.to_thread(_log_searches, user["id"], songs)
     except Exception:
         pass
 
@@ -0,0 +1,191 @@
+import os
+import time
+import bisect
+import asyncio
+import threading
+import contextvars
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from dotenv import load_dotenv
+
+from database import on_query, on_checkout
+
+load_dotenv()
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag probes
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+router = APIRouter(tags=["metrics"])
+
+_lock = threading.Lock()
+_registry: list["Histogram"] = []
+
+
+class Histogram:
+    """Prometheus-style histogram with labels; observe() is a bisect and a locked add."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count above last bucket, sum]
+        self._series: dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {cumulative}')
+            plain = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{plain} {series[-1]}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+http_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"),
+)
+http_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements per HTTP request", ("route",), QUERY_COUNT_BUCKETS,
+)
+http_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request", ("route",),
+)
+db_query_seconds = Histogram("db_query_seconds", "SQL statement latency", ("verb",))
+db_pool_wait = Histogram("db_pool_checkout_seconds", "Time to take a connection from the pool")
+upstream_duration = Histogram(
+    "upstream_request_duration_seconds", "Outbound HTTP latency until response headers", ("host", "status"),
+)
+loop_lag = Histogram("event_loop_lag_seconds", "How late the event loop wakes up a periodic timer")
+
+
+# ── Per-request context ──
+
+class RequestMetrics:
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+# Sync endpoints run in the threadpool with a copy of this context, so they
+# update the same RequestMetrics object as the middleware that created it.
+current_request: contextvars.ContextVar[RequestMetrics | None] = contextvars.ContextVar("request_metrics", default=None)
+
+
+@on_query
+def _record_query(sql, params, seconds: float):
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql else ""
+    db_query_seconds.observe(seconds, verb)
+    ctx = current_request.get()
+    if ctx is not None:
+        ctx.queries += 1
+        ctx.query_seconds += seconds
+
+
+@on_checkout
+def _record_checkout(seconds: float):
+    db_pool_wait.observe(seconds)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: times every HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestMetrics()
+        token = current_request.set(ctx)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_duration.observe(elapsed, scope["method"], route, str(status))
+            http_db_queries.observe(ctx.queries, route)
+            if ctx.queries:
+                http_db_seconds.observe(ctx.query_seconds, route)
+
+
+# ── Outbound HTTP ──
+
+class UpstreamTransport(httpx.AsyncHTTPTransport):
+    """Records upstream latency (until response headers) by host and status."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await super().handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            upstream_duration.observe(time.perf_counter() - started, request.url.host, status)
+
+
+def http_client(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=UpstreamTransport(), **kwargs)
+
+
+# ── Event loop ──
+
+async def monitor_loop_lag():
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lag.observe(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    lines = []
+    for histogram in _registry:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
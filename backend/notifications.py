@@ -0,0 +1,95 @@
+import asyncio
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from auth import decode_token
+from supervisor import SupervisedConnection
+
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+
+
+class NotificationHub:
+    """Per-user push channel for lobby and friendship events.
+
+    A user may have several tabs open, so each user id maps to a set of
+    sockets. `publish` is safe to call from sync endpoints running in the
+    threadpool as well as from coroutines on the event loop.
+    """
+
+    def __init__(self):
+        self._conns: dict[int, set[WebSocket]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def connect(self, user_id: int, ws: WebSocket):
+        self._loop = asyncio.get_running_loop()
+        self._conns.setdefault(user_id, set()).add(ws)
+
+    def disconnect(self, user_id: int, ws: WebSocket):
+        sockets = self._conns.get(user_id)
+        if not sockets:
+            return
+        sockets.discard(ws)
+        if not sockets:
+            del self._conns[user_id]
+
+    async def drop(self, user_id: int):
+        """Close every socket of a user (e.g. a deleted account)."""
+        for ws in list(self._conns.pop(user_id, ())):
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._conns
+
+    async def send(self, user_ids, msg: dict):
+        for uid in set(user_ids):
+            for ws in list(self._conns.get(uid, ())):
+                try:
+                    await ws.send_json(msg)
+                except Exception:
+                    self.disconnect(uid, ws)
+
+    def publish(self, user_ids, msg: dict):
+        """Fire-and-forget delivery to every online user in `user_ids`."""
+        targets = [uid for uid in set(user_ids) if uid in self._conns]
+        if not targets or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._loop.create_task(self.send(targets, msg))
+        else:
+            asyncio.run_coroutine_threadsafe(self.send(targets, msg), self._loop)
+
+
+hub = NotificationHub()
+
+
+@router.websocket("/ws")
+async def notifications_ws(ws: WebSocket):
+    await ws.accept()
+
+    token = ws.query_params.get("token")
+    user = decode_token(token) if token else None
+    if not user:
+        await ws.send_json({"type": "error", "message": "Token inválido o expirado"})
+        await ws.close()
+        return
+
+    hub.connect(user["id"], ws)
+    async with SupervisedConnection(ws) as sup:
+        try:
+            # The channel is push-only; incoming messages are just pongs
+            while True:
+                await ws.receive_text()
+                sup.seen()
+        except WebSocketDisconnect:
+            pass
+        except Exception:
+            pass
+        finally:
+            hub.disconnect(user["id"], ws)
@@ -0,0 +1,150 @@
+import os
+import asyncio
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+import httpx
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+from metrics import http_client
+
+load_dotenv()
+
+PREVIEW_CACHE_DIR = Path(os.getenv("PREVIEW_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "oido_previews"))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_MB", "512")) * 1024 * 1024
+DEEZER_API_URL = os.getenv("DEEZER_API_URL", "https://api.deezer.com").rstrip("/")
+PREVIEW_URLS_MAX = 20000  # upstream URLs remembered, oldest forgotten first
+
+
+class PreviewCache:
+    """Deezer preview MP3s cached on local disk with an LRU size limit.
+
+    Each track is downloaded at most once at a time: concurrent requests for
+    the same id wait on the same in-flight download.
+    """
+
+    def __init__(self, directory: Path = PREVIEW_CACHE_DIR, max_bytes: int = PREVIEW_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files: OrderedDict[int, int] = OrderedDict()  # track_id -> size, LRU order
+        self._total = 0
+        self._urls: OrderedDict[int, str] = OrderedDict()  # track_id -> preview URL, LRU order
+        self._inflight: dict[int, asyncio.Future] = {}
+        self._load_index()
+
+    def _load_index(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for f in self.directory.glob("*.mp3"):
+            try:
+                entries.append((f.stat().st_mtime, int(f.stem), f.stat().st_size))
+            except (ValueError, OSError):
+                continue
+        for _, track_id, size in sorted(entries):
+            self._files[track_id] = size
+            self._total += size
+
+    def path(self, track_id: int) -> Path:
+        return self.directory / f"{track_id}.mp3"
+
+    def remember(self, track_id: int, preview_url: str):
+        """Record the upstream URL of a track seen in a chart listing."""
+        self._urls[track_id] = preview_url
+        self._urls.move_to_end(track_id)
+        while len(self._urls) > PREVIEW_URLS_MAX:
+            self._urls.popitem(last=False)
+
+    def cached(self, track_id: int | None) -> bool:
+        return track_id in self._files
+
+    def known(self, track_id: int) -> bool:
+        """Whether the track came from a chart we served (or is already on disk)."""
+        return track_id in self._files or track_id in self._urls
+
+    async def get(self, track_id: int) -> Path:
+        if track_id in self._files:
+            self._files.move_to_end(track_id)
+            return self.path(track_id)
+
+        pending = self._inflight.get(track_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[track_id] = future
+        try:
+            path = await self._download(track_id)
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            # Cancellation too: waiters on the shared future would hang otherwise
+            if isinstance(e, Exception):
+                future.set_exception(e)
+            else:
+                future.set_exception(HTTPException(status_code=502, detail="Descarga de preview interrumpida"))
+            # Mark retrieved so a failure nobody awaited does not get logged
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(track_id, None)
+
+    def prefetch(self, track_id: int | None):
+        """Start downloading a preview in the background, ignoring errors."""
+        if not track_id or track_id in self._files or track_id in self._inflight:
+            return
+
+        async def _run():
+            try:
+                await self.get(track_id)
+            except Exception:
+                pass
+
+        asyncio.create_task(_run())
+
+    async def _resolve_url(self, client: httpx.AsyncClient, track_id: int) -> str:
+        url = self._urls.get(track_id)
+        if url:
+            return url
+        resp = await client.get(f"{DEEZER_API_URL}/track/{track_id}")
+        resp.raise_for_status()
+        url = resp.json().get("preview")
+        if not url:
+            raise HTTPException(status_code=404, detail="Preview no disponible")
+        self.remember(track_id, url)
+        return url
+
+    async def _download(self, track_id: int) -> Path:
+        try:
+            async with http_client(timeout=15) as client:
+                url = await self._resolve_url(client, track_id)
+                resp = await client.get(url)
+                resp.raise_for_status()
+                content = resp.content
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Error al obtener preview de Deezer: {str(e)}")
+
+        path = self.path(track_id)
+        tmp = path.with_suffix(".part")
+        await asyncio.to_thread(tmp.write_bytes, content)
+        os.replace(tmp, path)
+
+        self._files[track_id] = len(content)
+        self._total += len(content)
+        self._evict()
+        return path
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._files) > 1:
+            track_id, size = self._files.popitem(last=False)
+            self._total -= size
+            try:
+                self.path(track_id).unlink()
+            except OSError:
+                pass
+
+
+preview_cache = PreviewCache()
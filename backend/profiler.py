@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("oido.profiler")
+
+PROFILE_MAX_SECONDS = 60
+PROFILE_MIN_INTERVAL_MS = 1
+LOOP_BLOCK_WARN_MS = int(os.getenv("LOOP_BLOCK_WARN_MS", "500"))
+LOOP_HEARTBEAT_INTERVAL = 0.1  # seconds
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> list[str]:
+    """Root-first list of frame labels for one stack."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class SamplingProfiler:
+    """Wall-clock sampler over every thread, producing collapsed stacks.
+
+    A background thread reads sys._current_frames() at a fixed interval, so
+    the profiled code is not instrumented and keeps running at full speed
+    apart from the GIL hand-offs of the sampler itself. The output is the
+    "frame;frame;frame count" format understood by flamegraph.pl, speedscope
+    and similar tools.
+    """
+
+    def __init__(self):
+        self._busy = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._busy.locked()
+
+    def run(self, seconds: float, interval_ms: float) -> tuple[str, int]:
+        """Sample for `seconds`; returns (collapsed stacks, number of samples)."""
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("profile already running")
+        try:
+            own = threading.get_ident()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            counts: Counter[str] = Counter()
+            interval = interval_ms / 1000
+            deadline = time.monotonic() + seconds
+            samples = 0
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    thread = names.get(ident) or f"thread-{ident}"
+                    counts[";".join([thread, *_collapse(frame)])] += 1
+                samples += 1
+                time.sleep(interval)
+            lines = [f"{stack} {n}" for stack, n in counts.most_common()]
+            return "\n".join(lines) + "\n", samples
+        finally:
+            self._busy.release()
+
+
+profiler = SamplingProfiler()
+
+
+class LoopWatchdog:
+    """Warns with the event-loop thread's stack when the loop stops ticking.
+
+    A coroutine bumps a heartbeat every LOOP_HEARTBEAT_INTERVAL; a daemon
+    thread checks it and, once the heartbeat is LOOP_BLOCK_WARN_MS old, logs
+    where the loop thread is stuck (e.g. a sync DB call inside an async
+    endpoint). Each blocked episode is reported once.
+    """
+
+    def __init__(self, threshold_ms: int = LOOP_BLOCK_WARN_MS):
+        self.threshold = threshold_ms / 1000
+        self.blocked_episodes = 0
+        self._beat = time.monotonic()
+        self._loop_thread: int | None = None
+
+    async def _heartbeat(self):
+        self._loop_thread = threading.get_ident()
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(LOOP_HEARTBEAT_INTERVAL)
+
+    def _watch(self):
+        reported = False
+        while True:
+            time.sleep(LOOP_HEARTBEAT_INTERVAL)
+            stalled = time.monotonic() - self._beat
+            if stalled < self.threshold:
+                reported = False
+                continue
+            if reported or self._loop_thread is None:
+                continue
+            reported = True
+            self.blocked_episodes += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(sin stack)"
+            logger.warning("Event loop blocked for %.0f ms, loop thread stack:\n%s", stalled * 1000, stack)
+
+    def start(self):
+        asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+
+watchdog = LoopWatchdog()
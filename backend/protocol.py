@@ -0,0 +1,88 @@
+"""Compact game wire protocol.
+
+Clients that connect to /game/ws/{room_id} with `?proto=compact` receive every
+server message as a JSON array `[opcode, field1, field2, ...]` instead of an
+object with repeated string keys. Room states become small ints, scores drop
+the usernames (the client already has them from the player list) and the
+player list is delta-encoded per connection: only players whose score,
+canStop or connected flag changed are sent.
+
+Messages from the client stay plain JSON objects; they are few and small.
+"""
+
+import json
+
+STATES = ["LOBBY", "PLAYING", "THINKING", "ROUND_END"]
+
+OP_PLAYERS = 2
+
+# type -> (opcode, field order)
+MESSAGES = {
+    "state": (1, ("state",)),
+    "game_start": (3, ("previewUrl",)),
+    "player_stopped": (4, ("userId", "username")),
+    "keep_listening": (5, ("userId", "username")),
+    "round_won": (6, ("song", "winnerId", "winnerName", "scores")),
+    "round_lost": (7, ("song", "scores")),
+    "back_to_lobby": (8, ()),
+    "room_closed": (9, ("message",)),
+    "error": (10, ("message",)),
+    "resync": (11, ("state", "previewUrl", "remainingMs", "canStop", "stopperId", "scores", "song")),
+    "ping": (12, ()),
+}
+
+
+def _song(v):
+    if not v:
+        return None
+    return [v.get("title", ""), v.get("artist", ""), v.get("album", ""), v.get("cover", "")]
+
+
+FIELD_ENCODERS = {
+    "state": STATES.index,
+    "scores": lambda v: [[s["id"], s["score"]] for s in v],
+    "song": _song,
+}
+
+
+def dumps(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode(msg: dict):
+    """Compact form of a message, or the message itself for unknown types."""
+    spec = MESSAGES.get(msg.get("type"))
+    if spec is None:
+        return msg
+    opcode, fields = spec
+    out = [opcode]
+    for name in fields:
+        value = msg.get(name)
+        enc = FIELD_ENCODERS.get(name)
+        out.append(enc(value) if enc and value is not None else value)
+    return out
+
+
+class PlayerListDelta:
+    """Per-connection memory of the last player list sent, for delta encoding."""
+
+    def __init__(self):
+        self._sent: dict[int, tuple] = {}
+
+    def reset(self):
+        self._sent.clear()
+
+    def encode(self, players: list[dict]) -> list:
+        rows = []
+        current = {}
+        for p in players:
+            state = (p["score"], int(p["canStop"]), int(p.get("connected", True)))
+            current[p["id"]] = state
+            previous = self._sent.get(p["id"])
+            if previous is None:
+                rows.append([p["id"], *state, p["username"], int(p["isCreator"])])
+            elif previous != state:
+                rows.append([p["id"], *state])
+        removed = [uid for uid in self._sent if uid not in current]
+        self._sent = current
+        return [OP_PLAYERS, rows, removed]
@@ -0,0 +1,163 @@
+"""Slow-query log and per-request query budget (N+1 detector).
+
+Every statement runs through the database query listeners. Statements slower
+than SLOW_QUERY_MS are logged with their normalized SQL, parameter shape and
+the router line that issued them. With QUERY_TRACE_MODE set, each HTTP
+request also gets a trace:
+
+- "log": requests over QUERY_BUDGET statements, or repeating one statement
+  shape more than QUERY_MAX_REPEATS times, are logged with their call sites.
+- "strict": the statement that crosses either limit raises QueryBudgetError,
+  so the request fails with a 500 and a test exercising it fails too.
+
+Tests can also trace a router function called directly:
+
+    with querylog.traced(budget=4, max_repeats=1) as trace:
+        social.get_public_profile(1, {"id": 2, "username": "ana", "role": "user"})
+    assert not trace.violations()
+"""
+
+import os
+import re
+import sys
+import logging
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from database import on_query
+
+load_dotenv()
+
+logger = logging.getLogger("oido.queries")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+QUERY_TRACE_MODE = os.getenv("QUERY_TRACE_MODE", "off").lower()  # off | log | strict
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "10"))
+QUERY_MAX_REPEATS = int(os.getenv("QUERY_MAX_REPEATS", "3"))
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_BACKEND_DIR, f) for f in ("database.py", "querylog.py", "metrics.py")}
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS_LIST = re.compile(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetError(RuntimeError):
+    pass
+
+
+def normalize(sql: str) -> str:
+    """Statement shape: literals become ?, IN lists collapse, whitespace is squeezed."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDERS_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def params_shape(params) -> str:
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        # executemany: number of rows times the shape of one row
+        return f"{len(params)} x {params_shape(params[0])}"
+    return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+
+
+def call_site() -> str:
+    """First frame outside the database layer, e.g. 'social.py:305 get_public_profile'."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename not in _SKIP_FILES and filename.startswith(_BACKEND_DIR):
+            return f"{os.path.relpath(filename, _BACKEND_DIR)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+@dataclass
+class QueryRecord:
+    shape: str
+    params: str
+    ms: float
+    site: str
+
+
+@dataclass
+class RequestTrace:
+    label: str
+    budget: int = QUERY_BUDGET
+    max_repeats: int = QUERY_MAX_REPEATS
+    strict: bool = False
+    queries: list[QueryRecord] = field(default_factory=list)
+    counts: dict[str, int] = field(default_factory=dict)
+
+    def add(self, record: QueryRecord):
+        self.queries.append(record)
+        n = self.counts[record.shape] = self.counts.get(record.shape, 0) + 1
+        if self.strict and (len(self.queries) > self.budget or n > self.max_repeats):
+            raise QueryBudgetError(f"{self.label}: {'; '.join(self.violations())}")
+
+    def repeated(self) -> dict[str, int]:
+        return {shape: n for shape, n in self.counts.items() if n > self.max_repeats}
+
+    def violations(self) -> list[str]:
+        found = []
+        if len(self.queries) > self.budget:
+            found.append(f"{len(self.queries)} queries (budget {self.budget})")
+        for shape, n in self.repeated().items():
+            sites = sorted({q.site for q in self.queries if q.shape == shape})
+            found.append(f"{n}x {shape} from {', '.join(sites)}")
+        return found
+
+
+_current_trace: contextvars.ContextVar[RequestTrace | None] = contextvars.ContextVar("query_trace", default=None)
+
+
+@on_query
+def _trace_query(sql, params, seconds: float):
+    ms = seconds * 1000
+    trace = _current_trace.get()
+    slow = ms >= SLOW_QUERY_MS
+    if trace is None and not slow:
+        return
+    record = QueryRecord(normalize(sql or ""), params_shape(params), round(ms, 2), call_site())
+    if slow:
+        logger.warning("Slow query %.1f ms at %s: %s params=%s", ms, record.site, record.shape, record.params)
+    if trace is not None:
+        trace.add(record)
+
+
+@contextmanager
+def traced(label: str = "trace", budget: int = QUERY_BUDGET, max_repeats: int = QUERY_MAX_REPEATS, strict: bool = False):
+    """Collect the statements issued inside the block (including threadpool endpoints)."""
+    trace = RequestTrace(label, budget, max_repeats, strict)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+class QueryTraceMiddleware:
+    """Per-request query trace, enabled by QUERY_TRACE_MODE=log|strict."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        label = f"{scope['method']} {scope['path']}"
+        with traced(label, strict=QUERY_TRACE_MODE == "strict") as trace:
+            await self.app(scope, receive, send)
+        problems = trace.violations()
+        if problems:
+            logger.warning("Query budget exceeded in %s: %s", label, "; ".join(problems))
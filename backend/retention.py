@@ -0,0 +1,172 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Depends
+from dotenv import load_dotenv
+
+from database import get_connection
+from auth import require_admin
+from analytics import ROLLUP_NAME
+
+load_dotenv()
+
+router = APIRouter(prefix="/admin/retention", tags=["retention"])
+
+SEARCH_LOG_RETENTION_DAYS = int(os.getenv("SEARCH_LOG_RETENTION_DAYS", "365"))  # 0 disables pruning
+SEARCH_LOG_ARCHIVE_DIR = Path(os.getenv("SEARCH_LOG_ARCHIVE_DIR") or os.path.join(tempfile.gettempdir(), "oido_archive"))
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))  # seconds
+RETENTION_CHUNK = 1000  # rows archived and deleted per transaction
+RETENTION_PAUSE = 0.05  # seconds between chunks, so replication and other writers keep up
+
+ARCHIVE_COLUMNS = ("id", "user_id", "title", "artist", "album", "spotify_url", "youtube_url", "score", "created_at")
+
+
+class SearchLogRetention:
+    """Archives and prunes search_log rows older than the retention window.
+
+    Rows are walked in primary-key order, RETENTION_CHUNK at a time. Each
+    chunk is appended to a gzip JSONL file and flushed to disk before the same
+    id range is deleted in its own short transaction, so locks are held for
+    one small range at a time and a crash can at worst archive a chunk twice.
+    Rows not yet folded into the analytics rollups are never pruned.
+
+    MySQL cannot partition search_log while it has a foreign key to users,
+    so chunked deletes by id range are used instead of dropping partitions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_run: dict | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _chunk(self, cursor, after_id: int, cutoff: datetime, max_id: int) -> tuple[list[dict], bool]:
+        """Next expired rows in id order, and whether newer rows were reached.
+
+        Ids grow with time, so the walk stops at the first row inside the
+        window instead of scanning the rest of the table.
+        """
+        cursor.execute(
+            f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM search_log "
+            "WHERE id > %s AND id <= %s ORDER BY id LIMIT %s",
+            (after_id, max_id, RETENTION_CHUNK),
+        )
+        rows = cursor.fetchall()
+        expired = [r for r in rows if r["created_at"] < cutoff]
+        return expired, len(expired) < len(rows) or len(rows) < RETENTION_CHUNK
+
+    def run_once(self, days: int = SEARCH_LOG_RETENTION_DAYS) -> dict:
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("retention already running")
+        try:
+            return self._run(days)
+        finally:
+            self._lock.release()
+
+    def _run(self, days: int) -> dict:
+        started = time.time()
+        stats = {"archived": 0, "deleted": 0, "file": None, "startedAt": datetime.fromtimestamp(started).isoformat()}
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        raw = archive = None
+        try:
+            cutoff = datetime.now() - timedelta(days=days)
+            cursor.execute("SELECT last_id FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+            state = cursor.fetchone()
+            # Only rows the rollups have already counted may go
+            max_id = state["last_id"] if state else 0
+            conn.commit()
+
+            after_id = 0
+            done = False
+            while not done:
+                rows, done = self._chunk(cursor, after_id, cutoff, max_id)
+                conn.commit()
+                if not rows:
+                    break
+                if archive is None:
+                    SEARCH_LOG_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+                    path = SEARCH_LOG_ARCHIVE_DIR / f"search_log-{datetime.now():%Y%m%d-%H%M%S}.jsonl.gz"
+                    raw = open(path, "ab")
+                    archive = gzip.GzipFile(fileobj=raw, mode="ab")
+                    stats["file"] = str(path)
+                for r in rows:
+                    archive.write((json.dumps(r, default=_json_default, ensure_ascii=False) + "\n").encode("utf-8"))
+                # GzipFile.flush() also flushes the raw file; fsync it before deleting the range
+                archive.flush()
+                os.fsync(raw.fileno())
+                stats["archived"] += len(rows)
+
+                low, high = rows[0]["id"], rows[-1]["id"]
+                cursor.execute(
+                    "DELETE FROM search_log WHERE id >= %s AND id <= %s AND created_at < %s",
+                    (low, high, cutoff),
+                )
+                stats["deleted"] += cursor.rowcount
+                conn.commit()
+                after_id = high
+                time.sleep(RETENTION_PAUSE)
+        except Exception as e:
+            conn.rollback()
+            stats["error"] = str(e)
+            raise
+        finally:
+            if archive is not None:
+                archive.close()
+            if raw is not None:
+                raw.close()
+            cursor.close()
+            conn.close()
+            stats["seconds"] = round(time.time() - started, 2)
+            self.last_run = stats
+        return stats
+
+    async def run_forever(self):
+        if SEARCH_LOG_RETENTION_DAYS <= 0:
+            return
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                pass
+            await asyncio.sleep(RETENTION_INTERVAL)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+retention = SearchLogRetention()
+
+
+@router.get("/status")
+def retention_status(admin: dict = Depends(require_admin)):
+    return {
+        "retentionDays": SEARCH_LOG_RETENTION_DAYS,
+        "archiveDir": str(SEARCH_LOG_ARCHIVE_DIR),
+        "running": retention.running,
+        "lastRun": retention.last_run,
+    }
+
+
+@router.post("/run")
+async def run_retention(admin: dict = Depends(require_admin)):
+    if SEARCH_LOG_RETENTION_DAYS <= 0:
+        raise HTTPException(status_code=400, detail="La retención está desactivada")
+    if retention.running:
+        raise HTTPException(status_code=409, detail="La retención ya está en curso")
+    try:
+        return await asyncio.to_thread(retention.run_once)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="La retención ya está en curso")
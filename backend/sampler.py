@@ -0,0 +1,176 @@
+import random
+from collections import OrderedDict
+
+PLAYED_USERS_MAX = 10000
+REJECTION_TRIES = 8
+
+
+class TrackCatalog:
+    """Assigns a stable integer index to every track seen in a chart."""
+
+    def __init__(self):
+        self._index: dict[int | str, int] = {}
+        self._tracks: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def add(self, track: dict) -> int:
+        key = track.get("id") or track["preview_url"]
+        idx = self._index.get(key)
+        if idx is None:
+            idx = len(self._tracks)
+            self._index[key] = idx
+            self._tracks.append(track)
+        else:
+            # Preview URLs are signed and expire, keep the freshest copy
+            self._tracks[idx] = track
+        return idx
+
+    def track(self, idx: int) -> dict:
+        return self._tracks[idx]
+
+
+class ShuffleBag:
+    """Draw without replacement in O(1): swap the pick with the last item and pop."""
+
+    def __init__(self, items):
+        self._items = list(items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def draw(self, prefer=None) -> int:
+        """Remove and return a random item.
+
+        With `prefer` (a key function, lower is better) two random candidates
+        are compared and the preferred one is drawn; the other stays in the bag.
+        """
+        items = self._items
+        i = random.randrange(len(items))
+        if prefer is not None and len(items) > 1:
+            j = random.randrange(len(items))
+            if prefer(items[j]) < prefer(items[i]):
+                i = j
+        items[i], items[-1] = items[-1], items[i]
+        return items.pop()
+
+
+class RoomSampler:
+    """Per-room track sampler: no repeats within a game until a genre runs out."""
+
+    def __init__(self, popularity_bias: bool = False):
+        self.popularity_bias = popularity_bias
+        self._bags: dict[int, tuple[list[dict], ShuffleBag]] = {}
+        self._played: set[int] = set()
+
+    def reset(self):
+        self._bags.clear()
+        self._played.clear()
+
+    def draw(self, genre_id: int, tracks: list[dict]) -> dict | None:
+        if not tracks:
+            return None
+        entry = self._bags.get(genre_id)
+        if entry is None or entry[0] is not tracks:
+            # First draw for this genre, or the chart was refreshed
+            entry = (tracks, self._fill(tracks))
+            self._bags[genre_id] = entry
+        bag = entry[1]
+
+        # Tracks may appear in several genre charts: skip ones already played
+        while bag:
+            pos = bag.draw(self._rank if self.popularity_bias else None)
+            track = tracks[pos]
+            if track["idx"] not in self._played:
+                self._played.add(track["idx"])
+                return track
+
+        # Pool exhausted: allow this genre's tracks again
+        self._played.difference_update(t["idx"] for t in tracks)
+        bag = self._fill(tracks)
+        self._bags[genre_id] = (tracks, bag)
+        pos = bag.draw(self._rank if self.popularity_bias else None)
+        self._played.add(tracks[pos]["idx"])
+        return tracks[pos]
+
+    def _fill(self, tracks: list[dict]) -> ShuffleBag:
+        return ShuffleBag(i for i, t in enumerate(tracks) if t["idx"] not in self._played)
+
+    @staticmethod
+    def _rank(pos: int) -> int:
+        # Charts are ordered by popularity, so the position is the rank
+        return pos
+
+
+class PlayedBitset:
+    """Tracks a user has already heard, one bit per catalog index."""
+
+    def __init__(self):
+        self._bits = bytearray()
+
+    def __contains__(self, idx: int) -> bool:
+        byte = idx >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (idx & 7)))
+
+    def add(self, idx: int):
+        byte = idx >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte - len(self._bits) + 1))
+        self._bits[byte] |= 1 << (idx & 7)
+
+    def discard(self, idx: int):
+        byte = idx >> 3
+        if byte < len(self._bits):
+            self._bits[byte] &= ~(1 << (idx & 7)) & 0xFF
+
+
+class UserPlayedHistory:
+    """Played bitsets for the most recently active users (LRU bounded)."""
+
+    def __init__(self, max_users: int = PLAYED_USERS_MAX):
+        self.max_users = max_users
+        self._users: OrderedDict[int, PlayedBitset] = OrderedDict()
+
+    def _get(self, user_id: int) -> PlayedBitset:
+        played = self._users.get(user_id)
+        if played is None:
+            played = PlayedBitset()
+            self._users[user_id] = played
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return played
+
+    def pick(self, user_id: int, tracks: list[dict]) -> dict | None:
+        """Random track from `tracks` the user has not heard yet.
+
+        Rejection sampling keeps picks O(1) while most of the chart is unheard;
+        once the chart is used up the user's bits for it are cleared.
+        """
+        if not tracks:
+            return None
+        played = self._get(user_id)
+        track = None
+        for _ in range(REJECTION_TRIES):
+            candidate = random.choice(tracks)
+            if candidate["idx"] not in played:
+                track = candidate
+                break
+        if track is None:
+            remaining = [t for t in tracks if t["idx"] not in played]
+            if not remaining:
+                for t in tracks:
+                    played.discard(t["idx"])
+                remaining = tracks
+            track = random.choice(remaining)
+        played.add(track["idx"])
+        return track
+
+    def forget(self, user_id: int):
+        self._users.pop(user_id, None)
+
+
+catalog = TrackCatalog()
+user_history = UserPlayedHistory()
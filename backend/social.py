@@ -3,6 +3,8 @@ from pydantic import BaseModel
 
 from database import get_connection
 from auth import get_current_user
+from notifications import hub
+from friends import friend_graph
 
 router = APIRouter(prefix="/social", tags=["social"])
 
@@ -18,12 +20,12 @@ def search_users(q: str = "", user: dict = Depends(get_current_user)):
     try:
         if q.strip():
             cursor.execute(
-                "SELECT id, username, avatar FROM users WHERE username LIKE %s AND id != %s AND role != 'admin' ORDER BY username LIMIT 50",
+                "SELECT id, username, avatar FROM users WHERE username LIKE %s AND id != %s AND role != 'admin' AND deleted_at IS NULL ORDER BY username LIMIT 50",
                 (f"%{q}%", user["id"]),
             )
         else:
             cursor.execute(
-                "SELECT id, username, avatar FROM users WHERE id != %s AND role != 'admin' ORDER BY username LIMIT 50",
+                "SELECT id, username, avatar FROM users WHERE id != %s AND role != 'admin' AND deleted_at IS NULL ORDER BY username LIMIT 50",
                 (user["id"],),
             )
         users = cursor.fetchall()
@@ -77,7 +79,7 @@ def send_friend_request(body: FriendRequestBody, user: dict = Depends(get_curren
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id, role FROM users WHERE id = %s", (body.receiver_id,))
+        cursor.execute("SELECT id, role FROM users WHERE id = %s AND deleted_at IS NULL", (body.receiver_id,))
         receiver = cursor.fetchone()
         if not receiver:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -104,6 +106,13 @@ def send_friend_request(body: FriendRequestBody, user: dict = Depends(get_curren
                 (existing["id"],),
             )
             conn.commit()
+            friend_graph.added(user["id"], body.receiver_id)
+            hub.publish([body.receiver_id], {
+                "type": "friend_accepted",
+                "friendshipId": existing["id"],
+                "userId": user["id"],
+                "username": user["username"],
+            })
             return {"message": "Solicitud aceptada automaticamente (ambos se enviaron solicitud)", "autoAccepted": True}
 
         cursor.execute(
@@ -111,6 +120,12 @@ def send_friend_request(body: FriendRequestBody, user: dict = Depends(get_curren
             (user["id"], body.receiver_id),
         )
         conn.commit()
+        hub.publish([body.receiver_id], {
+            "type": "friend_request",
+            "requestId": cursor.lastrowid,
+            "senderId": user["id"],
+            "username": user["username"],
+        })
         return {"message": "Solicitud enviada", "id": cursor.lastrowid}
     finally:
         cursor.close()
@@ -125,7 +140,7 @@ def get_pending_requests(user: dict = Depends(get_current_user)):
         cursor.execute(
             """SELECT f.id, f.sender_id, u.username, u.avatar, f.created_at
                FROM friendships f
-               JOIN users u ON u.id = f.sender_id
+               JOIN users u ON u.id = f.sender_id AND u.deleted_at IS NULL
                WHERE f.receiver_id = %s AND f.status = 'pending'
                ORDER BY f.created_at DESC""",
             (user["id"],),
@@ -152,7 +167,7 @@ def accept_friend_request(request_id: int, user: dict = Depends(get_current_user
     cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute(
-            "SELECT id, receiver_id, status FROM friendships WHERE id = %s",
+            "SELECT id, sender_id, receiver_id, status FROM friendships WHERE id = %s",
             (request_id,),
         )
         req = cursor.fetchone()
@@ -168,6 +183,13 @@ def accept_friend_request(request_id: int, user: dict = Depends(get_current_user
             (request_id,),
         )
         conn.commit()
+        friend_graph.added(user["id"], req["sender_id"])
+        hub.publish([req["sender_id"]], {
+            "type": "friend_accepted",
+            "friendshipId": request_id,
+            "userId": user["id"],
+            "username": user["username"],
+        })
         return {"message": "Solicitud aceptada"}
     finally:
         cursor.close()
@@ -206,7 +228,7 @@ def get_friends(user: dict = Depends(get_current_user)):
             """SELECT f.id AS friendship_id, f.created_at AS friends_since,
                       u.id, u.username, u.avatar
                FROM friendships f
-               JOIN users u ON u.id = CASE WHEN f.sender_id = %s THEN f.receiver_id ELSE f.sender_id END
+               JOIN users u ON u.id = CASE WHEN f.sender_id = %s THEN f.receiver_id ELSE f.sender_id END AND u.deleted_at IS NULL
                WHERE (f.sender_id = %s OR f.receiver_id = %s) AND f.status = 'accepted'
                ORDER BY u.username""",
             (user["id"], user["id"], user["id"]),
@@ -244,6 +266,9 @@ def remove_friend(friendship_id: int, user: dict = Depends(get_current_user)):
 
         cursor.execute("DELETE FROM friendships WHERE id = %s", (friendship_id,))
         conn.commit()
+        other_id = friendship["receiver_id"] if friendship["sender_id"] == user["id"] else friendship["sender_id"]
+        friend_graph.removed(user["id"], other_id)
+        hub.publish([other_id], {"type": "friend_removed", "friendshipId": friendship_id, "userId": user["id"]})
         return {"message": "Amigo eliminado"}
     finally:
         cursor.close()
@@ -256,7 +281,7 @@ def get_public_profile(user_id: int, user: dict = Depends(get_current_user)):
     cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute(
-            "SELECT id, username, avatar, role, created_at FROM users WHERE id = %s",
+            "SELECT id, username, avatar, role, created_at FROM users WHERE id = %s AND deleted_at IS NULL",
             (user_id,),
         )
         profile = cursor.fetchone()
@@ -274,7 +299,7 @@ def get_public_profile(user_id: int, user: dict = Depends(get_current_user)):
         cursor.execute(
             """SELECT u.id, u.username, u.avatar
                FROM friendships f
-               JOIN users u ON u.id = CASE WHEN f.sender_id = %s THEN f.receiver_id ELSE f.sender_id END
+               JOIN users u ON u.id = CASE WHEN f.sender_id = %s THEN f.receiver_id ELSE f.sender_id END AND u.deleted_at IS NULL
                WHERE (f.sender_id = %s OR f.receiver_id = %s) AND f.status = 'accepted'
                ORDER BY u.username""",
             (user_id, user_id, user_id),
@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+
+from fastapi import WebSocket
+from dotenv import load_dotenv
+
+import protocol
+from supervisor import stats as connection_stats
+
+load_dotenv()
+
+SPECTATOR_MAX_RATE = float(os.getenv("SPECTATOR_MAX_UPDATES_PER_SEC", "2"))
+SPECTATOR_MAX_PER_ROOM = int(os.getenv("SPECTATOR_MAX_PER_ROOM", "500"))
+SPECTATOR_SEND_TIMEOUT = 2  # seconds a send may be stuck before the watcher is dropped
+
+
+class _Watcher:
+    """One spectator socket and its single-slot outbox (latest view wins)."""
+
+    __slots__ = ("ws", "pending", "wake", "sending_since", "close_code", "task")
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.pending: str | None = None
+        self.wake = asyncio.Event()
+        self.sending_since: float | None = None
+        self.close_code: int | None = None
+        self.task: asyncio.Task | None = None
+
+
+class SpectatorTier:
+    """Read-only, throttled fan-out for people watching a room.
+
+    Player broadcasts only call `notify`, which marks the view dirty and
+    returns immediately. A separate flusher task renders the latest room
+    snapshot at most SPECTATOR_MAX_RATE times per second and drops it into
+    each spectator's one-slot outbox, so intermediate states are coalesced
+    (latest state wins) and a crowd of watchers never delays the
+    timing-critical player messages.
+
+    Every spectator has its own sender task, so a send is never cancelled
+    halfway through a frame. A spectator whose send has been stuck for
+    SPECTATOR_SEND_TIMEOUT stops getting views and is closed with 1008 once
+    that send returns.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._watchers: dict[WebSocket, _Watcher] = {}
+        self._dirty = asyncio.Event()
+        self._last_event: dict | None = None
+        self._flusher: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._watchers)
+
+    @property
+    def full(self) -> bool:
+        return len(self._watchers) >= SPECTATOR_MAX_PER_ROOM
+
+    def add(self, ws: WebSocket):
+        watcher = _Watcher(ws)
+        watcher.task = asyncio.create_task(self._send_loop(watcher))
+        self._watchers[ws] = watcher
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_forever())
+        self._dirty.set()
+
+    def remove(self, ws: WebSocket):
+        """The spectator disconnected: stop its sender."""
+        watcher = self._watchers.pop(ws, None)
+        if watcher is not None and watcher.task:
+            watcher.task.cancel()
+        if not self._watchers:
+            # Wake the flusher so it sees the room has no audience and exits
+            self._dirty.set()
+
+    def notify(self, msg: dict):
+        if not self._watchers:
+            return
+        if msg.get("type") != "players":
+            self._last_event = msg
+        self._dirty.set()
+
+    def close(self, msg: dict | None = None):
+        """Send `msg` to every spectator and close them once their outbox drains."""
+        if self._flusher:
+            self._flusher.cancel()
+        watchers, self._watchers = self._watchers, {}
+        text = protocol.dumps(msg) if msg else None
+        for watcher in watchers.values():
+            self._drop(watcher, 1000, text)
+
+    def _drop(self, watcher: _Watcher, code: int, final: str | None = None):
+        self._watchers.pop(watcher.ws, None)
+        watcher.close_code = code
+        watcher.pending = final
+        watcher.wake.set()
+
+    async def _send_loop(self, watcher: _Watcher):
+        try:
+            while True:
+                await watcher.wake.wait()
+                watcher.wake.clear()
+                text, watcher.pending = watcher.pending, None
+                if text is not None:
+                    watcher.sending_since = time.monotonic()
+                    try:
+                        await watcher.ws.send_text(text)
+                    except Exception:
+                        self._watchers.pop(watcher.ws, None)
+                        return
+                    finally:
+                        watcher.sending_since = None
+                    connection_stats.bytes_out += len(text)
+                    connection_stats.messages_out += 1
+                if watcher.close_code is not None:
+                    try:
+                        await watcher.ws.close(code=watcher.close_code)
+                    except Exception:
+                        pass
+                    return
+        except asyncio.CancelledError:
+            pass
+
+    async def _flush_forever(self):
+        interval = 1 / SPECTATOR_MAX_RATE
+        try:
+            while self._watchers:
+                await self._dirty.wait()
+                self._dirty.clear()
+                if not self._watchers:
+                    break
+                view = self._snapshot()
+                view["lastEvent"] = self._last_event
+                view["spectators"] = len(self._watchers)
+                text = protocol.dumps(view)
+                now = time.monotonic()
+                for watcher in list(self._watchers.values()):
+                    if watcher.sending_since is not None and now - watcher.sending_since > SPECTATOR_SEND_TIMEOUT:
+                        self._drop(watcher, 1008)
+                    else:
+                        watcher.pending = text
+                        watcher.wake.set()
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,119 @@
+import os
+import time
+import asyncio
+
+from fastapi import WebSocket
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HEARTBEAT_INTERVAL = int(os.getenv("WS_HEARTBEAT_INTERVAL", "15"))
+HEARTBEAT_TIMEOUT = int(os.getenv("WS_HEARTBEAT_TIMEOUT", "45"))
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_PER_SEC = 5
+RATE_LIMIT_MAX_STRIKES = 20  # Dropped messages before the connection is closed
+
+
+class ConnectionStats:
+    """Process-wide WebSocket counters, for sizing nodes by active connections."""
+
+    def __init__(self):
+        self.active = 0
+        self.opened = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_out = 0
+        self.rate_limited = 0
+        self.dead_evicted = 0
+        self.abusive_closed = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "active": self.active,
+            "opened": self.opened,
+            "messagesIn": self.messages_in,
+            "messagesOut": self.messages_out,
+            "bytesOut": self.bytes_out,
+            "rateLimited": self.rate_limited,
+            "deadEvicted": self.dead_evicted,
+            "abusiveClosed": self.abusive_closed,
+        }
+
+
+stats = ConnectionStats()
+
+
+class SupervisedConnection:
+    """Heartbeat and per-connection rate limiting around one WebSocket.
+
+    The server sends {"type": "ping"} every HEARTBEAT_INTERVAL seconds; any
+    incoming message (normally {"type": "pong"}) counts as a sign of life.
+    A peer silent for HEARTBEAT_TIMEOUT seconds is closed, which ends the
+    endpoint's receive loop and runs its normal disconnect handling.
+    """
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.last_seen = time.monotonic()
+        self._tokens = float(RATE_LIMIT_BURST)
+        self._refilled_at = self.last_seen
+        self._strikes = 0
+        self._heartbeat: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        stats.active += 1
+        stats.opened += 1
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        return self
+
+    async def __aexit__(self, *exc):
+        stats.active -= 1
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        return False
+
+    def seen(self):
+        self.last_seen = time.monotonic()
+        stats.messages_in += 1
+
+    def allow(self) -> bool:
+        """Token bucket check for one incoming message."""
+        now = time.monotonic()
+        self._tokens = min(RATE_LIMIT_BURST, self._tokens + (now - self._refilled_at) * RATE_LIMIT_PER_SEC)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        stats.rate_limited += 1
+        self._strikes += 1
+        return False
+
+    @property
+    def abusive(self) -> bool:
+        return self._strikes >= RATE_LIMIT_MAX_STRIKES
+
+    async def close_abusive(self):
+        stats.abusive_closed += 1
+        try:
+            await self.ws.send_json({"type": "error", "message": "Demasiados mensajes"})
+            await self.ws.close(code=1008)
+        except Exception:
+            pass
+
+    async def _heartbeat_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(HEARTBEAT_INTERVAL)
+                if time.monotonic() - self.last_seen > HEARTBEAT_TIMEOUT:
+                    stats.dead_evicted += 1
+                    await self.ws.close(code=1001)
+                    return
+                await self.ws.send_json({"type": "ping"})
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Sending failed: the socket is already gone
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
@@ -0,0 +1,95 @@
+"""Shared fixtures: the MySQL pool is replaced by scripted fake connections.
+
+database.py builds its pool at import time, so the pool class is swapped
+before the first import and each test installs a FakeDB that answers the
+statements it cares about.
+"""
+
+import os
+import sys
+from unittest import mock
+
+import pytest
+from mysql.connector import pooling
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakePool:
+    def __init__(self, **config):
+        self.db = None
+
+    def get_connection(self):
+        return FakeConnection(self.db)
+
+
+with mock.patch.object(pooling, "MySQLConnectionPool", FakePool):
+    import database  # noqa: E402
+
+
+class FakeDB:
+    """Records statements; `handler(sql, params)` returns (rows, rowcount)."""
+
+    def __init__(self):
+        self.executed: list[tuple[str, object]] = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.handler = lambda sql, params: ([], 0)
+
+
+class FakeCursor:
+    def __init__(self, db: FakeDB, dictionary: bool):
+        self.db = db
+        self.dictionary = dictionary
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows: list = []
+
+    def execute(self, sql, params=None):
+        self.db.executed.append((sql, params))
+        rows, rowcount = self.db.handler(sql, params)
+        self._rows = [r if self.dictionary else tuple(r.values()) for r in rows]
+        self.rowcount = rowcount if rowcount is not None else len(self._rows)
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db: FakeDB):
+        self.db = db
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self.db, dictionary)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db():
+    db = FakeDB()
+    database.pool.db = db
+    yield db
+    database.pool.db = None
@@ -0,0 +1,50 @@
+import re
+
+import pytest
+
+import database
+import querylog
+from querylog import QueryBudgetError
+
+ADMIN = {"id": 1, "username": "admin", "role": "admin"}
+
+
+def test_strict_trace_fails_on_per_item_queries(fake_db):
+    fake_db.handler = lambda sql, params: ([{"id": params[0], "username": f"u{params[0]}"}], None)
+    conn = database.get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    with pytest.raises(QueryBudgetError, match=re.escape("4x SELECT id, username FROM users WHERE id = %s")):
+        with querylog.traced("n+1", budget=50, max_repeats=3, strict=True):
+            for user_id in range(10):
+                cursor.execute("SELECT id, username FROM users WHERE id = %s", (user_id,))
+                cursor.fetchone()
+
+
+def test_strict_trace_fails_over_budget(fake_db):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+
+    with pytest.raises(QueryBudgetError, match=re.escape("3 queries (budget 2)")):
+        with querylog.traced("budget", budget=2, max_repeats=10, strict=True):
+            cursor.execute("SELECT 1")
+            cursor.execute("SELECT 2 FROM users")
+            cursor.execute("SELECT 3 FROM search_log")
+
+
+def test_update_user_stays_within_budget(fake_db):
+    import admin
+
+    def handler(sql, params):
+        if sql.startswith("SELECT id, role"):
+            return [{"id": 7, "role": "admin", "deleted_at": None, "username_taken": 0, "email_taken": 0}], None
+        return [], 1
+
+    fake_db.handler = handler
+    body = admin.UpdateUserBody(username="nuevo", email="nuevo@example.com", role="user")
+
+    with querylog.traced("update_user", budget=2, max_repeats=1, strict=True) as trace:
+        admin.update_user(7, body, ADMIN)
+
+    assert [q.shape.split()[0] for q in trace.queries] == ["SELECT", "UPDATE"]
+    assert fake_db.commits == 1
@@ -0,0 +1,45 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import retention
+
+OLD = datetime.now() - timedelta(days=400)
+NEW = datetime.now() - timedelta(days=10)
+
+
+def _row(row_id, created_at):
+    return {
+        "id": row_id, "user_id": 1, "title": f"t{row_id}", "artist": "a", "album": "b",
+        "spotify_url": None, "youtube_url": None, "score": 80, "created_at": created_at,
+    }
+
+
+def test_run_archives_and_deletes_expired_rows(fake_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "SEARCH_LOG_ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(retention, "RETENTION_PAUSE", 0)
+    table = [_row(1, OLD), _row(2, OLD), _row(3, NEW)]
+
+    def handler(sql, params):
+        if sql.startswith("SELECT last_id FROM rollup_state"):
+            return [{"last_id": 3}], None
+        if sql.startswith("SELECT id, user_id"):
+            after_id, max_id, limit = params
+            return [r for r in table if after_id < r["id"] <= max_id][:limit], None
+        if sql.startswith("DELETE FROM search_log"):
+            low, high, cutoff = params
+            gone = [r for r in table if low <= r["id"] <= high and r["created_at"] < cutoff]
+            table[:] = [r for r in table if r not in gone]
+            return [], len(gone)
+        return [], 0
+
+    fake_db.handler = handler
+    stats = retention.SearchLogRetention()._run(365)
+
+    assert stats["archived"] == 2
+    assert stats["deleted"] == 2
+    assert [r["id"] for r in table] == [3]
+    with gzip.open(stats["file"], "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [r["id"] for r in archived] == [1, 2]
+    assert archived[0]["created_at"] == OLD.isoformat()
@@ -3,31 +3,62 @@ import { useNavigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
+const PAGE_SIZE = 50;
+const SEARCH_DEBOUNCE_MS = 300;
+const EMPTY_FILTERS = { q: "", role: "", from: "", to: "", sort: "newest" };
 
 export default function Admin() {
   const { token } = useAuth();
   const navigate = useNavigate();
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(null);
+  const [filters, setFilters] = useState(EMPTY_FILTERS);
+  const [query, setQuery] = useState(EMPTY_FILTERS);
+  const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [editingId, setEditingId] = useState(null);
   const [editForm, setEditForm] = useState({});
 
   const headers = { Authorization: `Bearer ${token}`, "Content-Type": "application/json" };
 
-  const fetchUsers = useCallback(async () => {
+  // Debounce the username search; the other filters apply immediately
+  useEffect(() => {
+    const timer = setTimeout(() => setQuery(filters), filters.q !== query.q ? SEARCH_DEBOUNCE_MS : 0);
+    return () => clearTimeout(timer);
+  }, [filters]);
+
+  // Loads the first page for the current filters, or the next page when a cursor is given
+  const fetchUsers = useCallback(async (cursor = null) => {
+    const params = new URLSearchParams({ limit: PAGE_SIZE, sort: query.sort });
+    if (query.q.trim()) params.set("q", query.q.trim());
+    if (query.role) params.set("role", query.role);
+    if (query.from) params.set("created_from", `${query.from}T00:00:00`);
+    if (query.to) params.set("created_to", `${query.to}T23:59:59`);
+    if (cursor) params.set("cursor", cursor);
+
+    setLoading(true);
     try {
-      const res = await fetch(`${API_URL}/admin/users`, { headers });
+      const res = await fetch(`${API_URL}/admin/users?${params}`, { headers });
       if (!res.ok) throw new Error("Error al cargar usuarios");
-      setUsers(await res.json());
+      const data = await res.json();
+      setUsers((prev) => (cursor ? [...prev, ...data.users] : data.users));
+      setNextCursor(data.nextCursor);
+      if (!cursor) setTotal(data.totalExact ? `${data.total}` : `~${data.total}`);
+      setError(null);
     } catch (e) {
       setError(e.message);
+    } finally {
+      setLoading(false);
     }
-  }, [token]);
+  }, [token, query]);
 
   useEffect(() => {
     fetchUsers();
   }, [fetchUsers]);
 
+  const updateFilter = (field) => (e) => setFilters({ ...filters, [field]: e.target.value });
+
   const handleDelete = async (id, username) => {
     if (!confirm(`¿Eliminar al usuario "${username}"?`)) return;
     try {
@@ -84,6 +115,28 @@ export default function Admin() {
     <div className="admin-page">
       <div className="admin-header">
         <h2>Gestión de Usuarios</h2>
+        {total !== null && <span className="admin-total">{total} usuarios</span>}
+      </div>
+
+      <div className="admin-filters">
+        <input
+          className="admin-edit-input"
+          placeholder="Buscar por usuario..."
+          value={filters.q}
+          onChange={updateFilter("q")}
+        />
+        <select className="admin-edit-input" value={filters.role} onChange={updateFilter("role")}>
+          <option value="">Todos los roles</option>
+          <option value="user">user</option>
+          <option value="admin">admin</option>
+        </select>
+        <input className="admin-edit-input" type="date" title="Registrado desde" value={filters.from} onChange={updateFilter("from")} />
+        <input className="admin-edit-input" type="date" title="Registrado hasta" value={filters.to} onChange={updateFilter("to")} />
+        <select className="admin-edit-input" value={filters.sort} onChange={updateFilter("sort")}>
+          <option value="newest">Más recientes</option>
+          <option value="oldest">Más antiguos</option>
+          <option value="username">Por usuario</option>
+        </select>
       </div>
 
       {error && <p className="auth-error">{error}</p>}
@@ -174,6 +227,12 @@ export default function Admin() {
           </tbody>
         </table>
       </div>
+
+      {nextCursor && (
+        <button className="admin-load-more" onClick={() => fetchUsers(nextCursor)} disabled={loading}>
+          {loading ? "Cargando..." : "Cargar más"}
+        </button>
+      )}
     </div>
   );
 }
@@ -11,6 +11,7 @@ import {
   getFriends,
   removeFriend,
 } from "../utils/social";
+import { subscribeNotifications } from "../utils/notifications";
 
 export default function Friends() {
   const { user } = useAuth();
@@ -41,6 +42,18 @@ export default function Friends() {
     Promise.all([loadAllUsers(), loadFriends(), loadRequests()]).finally(() => setLoading(false));
   }, [loadAllUsers, loadFriends, loadRequests]);
 
+  useEffect(() => {
+    return subscribeNotifications((event) => {
+      if (event.type === "friend_request") {
+        loadRequests();
+        loadAllUsers();
+      } else if (event.type === "friend_accepted" || event.type === "friend_removed") {
+        loadFriends();
+        loadAllUsers();
+      }
+    });
+  }, [loadAllUsers, loadFriends, loadRequests]);
+
   const filteredUsers = allUsers.filter((u) =>
     u.username.toLowerCase().includes(userFilter.toLowerCase())
   );
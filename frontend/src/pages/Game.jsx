@@ -1,10 +1,16 @@
 import { useState, useRef, useEffect, useCallback } from "react";
 import { useParams, Link } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
+import { createDecoder } from "../utils/gameProtocol";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 const WS_BASE = API_URL.replace(/^http/, "ws");
 
+// The backend serves previews through its own cache as relative paths
+export function resolvePreviewUrl(url) {
+  return url && url.startsWith("/") ? `${API_URL}${url}` : url;
+}
+
 // Module-level audio ref so it can be stopped from outside (e.g. route change)
 let _activeAudio = null;
 export function stopGameAudio() {
@@ -77,15 +83,16 @@ export default function Game() {
     audioRef.current = null;
   }, []);
 
-  const playPreview = useCallback((url) => {
+  const playPreview = useCallback((url, offsetMs = 0) => {
     stopGameAudio();
     const audio = new Audio(url);
     audioRef.current = audio;
     _activeAudio = audio;
-    const startTime = Date.now();
+    const startTime = Date.now() - offsetMs;
     const duration = 30000;
 
     audio.addEventListener("canplaythrough", () => {
+      if (offsetMs) audio.currentTime = offsetMs / 1000;
       audio.play().catch(() => {});
 
       progressIntervalRef.current = setInterval(() => {
@@ -158,8 +165,9 @@ export default function Game() {
 
     function connect() {
       setPhase(PHASES.CONNECTING);
-      const ws = new WebSocket(`${WS_BASE}/game/ws/${roomId}?token=${encodeURIComponent(token)}`);
+      const ws = new WebSocket(`${WS_BASE}/game/ws/${roomId}?token=${encodeURIComponent(token)}&proto=compact`);
       wsRef.current = ws;
+      const decode = createDecoder();
 
       ws.onopen = () => {
         // Will receive state + players messages shortly
@@ -168,12 +176,17 @@ export default function Game() {
       ws.onmessage = (event) => {
         let data;
         try {
-          data = JSON.parse(event.data);
+          data = decode(JSON.parse(event.data));
         } catch {
           return;
         }
+        if (!data) return;
 
         switch (data.type) {
+          case "ping":
+            ws.send(JSON.stringify({ type: "pong" }));
+            break;
+
           case "state":
             // Sync phase with server state on connect/reconnect
             if (data.state === "LOBBY") setPhase(PHASES.LOBBY);
@@ -204,10 +217,33 @@ export default function Game() {
             setWinnerName(null);
             setStopperName(null);
             setCanStop(true);
-            previewUrlRef = data.previewUrl;
-            playPreview(data.previewUrl);
+            previewUrlRef = resolvePreviewUrl(data.previewUrl);
+            playPreview(previewUrlRef);
             break;
 
+          case "resync": {
+            // Reconnected to a running game: resume from the server's state
+            const u = userRef.current;
+            clearAllTimers();
+            setCanStop(data.canStop);
+            setScores(data.scores);
+            previewUrlRef = data.previewUrl ? resolvePreviewUrl(data.previewUrl) : null;
+            if (data.state === "PLAYING" && previewUrlRef) {
+              setPhase(PHASES.PLAYING);
+              setStopperName(null);
+              playPreview(previewUrlRef, Math.max(0, 30000 - (data.remainingMs ?? 30000)));
+            } else if (data.state === "THINKING") {
+              stopAudio();
+              setPhase(u && data.stopperId === u.id ? PHASES.THINKING : PHASES.WATCHING);
+              setThinkTime(((data.remainingMs ?? 0) / 10000) * 100);
+            } else if (data.state === "ROUND_END") {
+              setPhase(PHASES.ROUND_END);
+              if (data.song) setSongInfo(data.song);
+              if (previewUrlRef) playSongLoop(previewUrlRef);
+            }
+            break;
+          }
+
           case "player_stopped": {
             const u = userRef.current;
             clearAllTimers();
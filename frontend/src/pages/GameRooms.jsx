@@ -4,6 +4,7 @@ import { useAuth } from "../context/AuthContext";
 import { getAvatarEmoji } from "./Profile";
 import { getFriends } from "../utils/social";
 import { createRoom, getMyRooms, closeRoom } from "../utils/gameRooms";
+import { subscribeNotifications } from "../utils/notifications";
 
 export default function GameRooms() {
   const { user } = useAuth();
@@ -31,6 +32,22 @@ export default function GameRooms() {
     Promise.all([loadRooms(), loadFriends()]).finally(() => setLoading(false));
   }, [loadRooms, loadFriends]);
 
+  // Room list updates are pushed by the server instead of polled
+  useEffect(() => {
+    return subscribeNotifications((event) => {
+      if (event.type === "room_created" || event.type === "room_updated") {
+        setRooms((prev) => {
+          const others = prev.filter((r) => r.roomId !== event.room.roomId);
+          return [...others, event.room].sort((a, b) => a.createdAt - b.createdAt);
+        });
+      } else if (event.type === "room_removed") {
+        setRooms((prev) => prev.filter((r) => r.roomId !== event.roomId));
+      } else if (event.type === "friend_accepted" || event.type === "friend_removed") {
+        loadFriends();
+      }
+    });
+  }, [loadFriends]);
+
   const toggleFriend = (id) => {
     setSelectedFriends((prev) => {
       const next = new Set(prev);
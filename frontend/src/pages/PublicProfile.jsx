@@ -2,7 +2,7 @@ import { useState, useEffect, useCallback } from "react";
 import { useParams, Link, Navigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
 import { getAvatarEmoji } from "./Profile";
-import { getPublicProfile, sendFriendRequest, removeFriend } from "../utils/social";
+import { getPublicProfile, sendFriendRequest, removeFriend, getFriendsLeaderboard } from "../utils/social";
 
 export default function PublicProfile() {
   const { userId } = useParams();
@@ -11,6 +11,7 @@ export default function PublicProfile() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [actionLoading, setActionLoading] = useState(false);
+  const [ranking, setRanking] = useState([]);
 
   const loadProfile = useCallback(async () => {
     try {
@@ -27,6 +28,10 @@ export default function PublicProfile() {
     loadProfile();
   }, [loadProfile]);
 
+  useEffect(() => {
+    getFriendsLeaderboard(userId).then(setRanking);
+  }, [userId]);
+
   const handleSendRequest = async () => {
     setActionLoading(true);
     try {
@@ -155,6 +160,21 @@ export default function PublicProfile() {
           )}
         </div>}
 
+        {ranking.length > 1 && (
+          <div className="public-profile-friends">
+            <h3 className="public-profile-friends-title">Ranking entre amigos</h3>
+            <div className="friends-list">
+              {ranking.map((r) => (
+                <div key={r.id} className="friends-list-item">
+                  <span className="friends-list-avatar">{r.rank}. {getAvatarEmoji(r.avatar)}</span>
+                  <span className="friends-list-name">{r.username}</span>
+                  <span className="friends-list-actions">{r.score} pts</span>
+                </div>
+              ))}
+            </div>
+          </div>
+        )}
+
         {profile.friends.length > 0 && (
           <div className="public-profile-friends">
             <h3 className="public-profile-friends-title">Amigos ({profile.friends.length})</h3>
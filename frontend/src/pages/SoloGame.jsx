@@ -1,6 +1,6 @@
 import { useState, useRef, useCallback, useEffect } from "react";
 import { Link } from "react-router-dom";
-import { stopGameAudio } from "./Game";
+import { stopGameAudio, resolvePreviewUrl } from "./Game";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
@@ -167,12 +167,13 @@ export default function SoloGame() {
       const data = await res.json();
       setSessionToken(data.sessionToken);
       sessionTokenRef.current = data.sessionToken;
-      setPreviewUrl(data.previewUrl);
+      const songUrl = resolvePreviewUrl(data.previewUrl);
+      setPreviewUrl(songUrl);
       setProgress(0);
       setThinkTime(100);
       setSongInfo(null);
       setPhase(PHASES.PLAYING);
-      playPreview(data.previewUrl);
+      playPreview(songUrl);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -243,12 +244,13 @@ export default function SoloGame() {
       const data = await res.json();
       setSessionToken(data.sessionToken);
       sessionTokenRef.current = data.sessionToken;
-      setPreviewUrl(data.previewUrl);
+      const songUrl = resolvePreviewUrl(data.previewUrl);
+      setPreviewUrl(songUrl);
       setProgress(0);
       setThinkTime(100);
       setSongInfo(null);
       setPhase(PHASES.PLAYING);
-      playPreview(data.previewUrl);
+      playPreview(songUrl);
     } catch (err) {
       setError(err.message);
     } finally {
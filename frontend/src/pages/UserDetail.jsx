@@ -16,15 +16,12 @@ export default function UserDetail() {
 
   useEffect(() => {
     async function fetchData() {
-      const [usersRes, logRes, savedRes] = await Promise.all([
-        fetch(`${API_URL}/admin/users`, { headers }),
+      const [userRes, logRes, savedRes] = await Promise.all([
+        fetch(`${API_URL}/admin/users/${userId}`, { headers }),
         fetch(`${API_URL}/admin/users/${userId}/search-log`, { headers }),
         fetch(`${API_URL}/admin/users/${userId}/saved`, { headers }),
       ]);
-      if (usersRes.ok) {
-        const users = await usersRes.json();
-        setUser(users.find((u) => u.id === Number(userId)) || null);
-      }
+      setUser(userRes.ok ? await userRes.json() : null);
       setSearchLog(logRes.ok ? await logRes.json() : []);
       setSavedHistory(savedRes.ok ? await savedRes.json() : []);
     }
@@ -40,6 +37,18 @@ export default function UserDetail() {
 
   const currentList = historyTab === "log" ? searchLog : savedHistory;
 
+  async function handleExport(format) {
+    const path = historyTab === "log" ? "search-log" : "saved";
+    const res = await fetch(`${API_URL}/admin/users/${userId}/${path}/export?format=${format}`, { headers });
+    if (!res.ok) return;
+    const url = URL.createObjectURL(await res.blob());
+    const link = document.createElement("a");
+    link.href = url;
+    link.download = `${path}-${userId}.${format}`;
+    link.click();
+    URL.revokeObjectURL(url);
+  }
+
   if (!user) {
     return (
       <div className="auth-page">
@@ -106,6 +115,10 @@ export default function UserDetail() {
           >
             Guardadas ({savedHistory.length})
           </button>
+          <div className="admin-export">
+            <button className="admin-tab" onClick={() => handleExport("csv")}>CSV</button>
+            <button className="admin-tab" onClick={() => handleExport("jsonl")}>JSONL</button>
+          </div>
         </div>
 
         {currentList.length === 0 ? (
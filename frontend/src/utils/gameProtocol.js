@@ -0,0 +1,67 @@
+// Decoder for the compact game protocol (backend/protocol.py).
+// Compact messages are arrays [opcode, ...fields]; plain objects pass through.
+
+const STATES = ["LOBBY", "PLAYING", "THINKING", "ROUND_END"];
+const OP_PLAYERS = 2;
+
+const MESSAGES = {
+  1: ["state", ["state"]],
+  3: ["game_start", ["previewUrl"]],
+  4: ["player_stopped", ["userId", "username"]],
+  5: ["keep_listening", ["userId", "username"]],
+  6: ["round_won", ["song", "winnerId", "winnerName", "scores"]],
+  7: ["round_lost", ["song", "scores"]],
+  8: ["back_to_lobby", []],
+  9: ["room_closed", ["message"]],
+  10: ["error", ["message"]],
+  11: ["resync", ["state", "previewUrl", "remainingMs", "canStop", "stopperId", "scores", "song"]],
+  12: ["ping", []],
+};
+
+// One decoder per connection: it holds the player list the deltas apply to
+export function createDecoder() {
+  const players = new Map();
+
+  const decodeField = (name, value) => {
+    if (value === null || value === undefined) return value;
+    if (name === "state") return STATES[value];
+    if (name === "scores") {
+      return value.map(([id, score]) => ({ id, score, username: players.get(id)?.username ?? "" }));
+    }
+    if (name === "song") {
+      const [title, artist, album, cover] = value;
+      return { title, artist, album, cover };
+    }
+    return value;
+  };
+
+  return function decode(raw) {
+    if (!Array.isArray(raw)) return raw;
+    const [op, ...rest] = raw;
+
+    if (op === OP_PLAYERS) {
+      const [rows, removed] = rest;
+      for (const [id, score, canStop, connected, username, isCreator] of rows) {
+        const prev = players.get(id) || { id };
+        players.set(id, {
+          ...prev,
+          score,
+          canStop: Boolean(canStop),
+          connected: Boolean(connected),
+          ...(username !== undefined && { username, isCreator: Boolean(isCreator) }),
+        });
+      }
+      removed.forEach((id) => players.delete(id));
+      return { type: "players", players: [...players.values()].map((p) => ({ ...p })) };
+    }
+
+    const spec = MESSAGES[op];
+    if (!spec) return null;
+    const [type, fields] = spec;
+    const msg = { type };
+    fields.forEach((name, i) => {
+      msg[name] = decodeField(name, rest[i]);
+    });
+    return msg;
+  };
+}
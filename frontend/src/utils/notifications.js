@@ -0,0 +1,44 @@
+const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
+const WS_BASE = API_URL.replace(/^http/, "ws");
+const RECONNECT_DELAY_MS = 3000;
+
+function getToken() {
+  return localStorage.getItem("oidoMusical_token");
+}
+
+// Opens the per-user push channel and calls onEvent for every message.
+// Reconnects automatically until the returned unsubscribe function is called.
+export function subscribeNotifications(onEvent) {
+  let ws = null;
+  let closed = false;
+  let retryTimer = null;
+
+  const connect = () => {
+    const token = getToken();
+    if (!token || closed) return;
+    ws = new WebSocket(`${WS_BASE}/notifications/ws?token=${encodeURIComponent(token)}`);
+    ws.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.type === "ping") {
+          ws.send(JSON.stringify({ type: "pong" }));
+          return;
+        }
+        onEvent(data);
+      } catch {
+        // ignore malformed messages
+      }
+    };
+    ws.onclose = () => {
+      if (!closed) retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+    };
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (ws) ws.close();
+  };
+}
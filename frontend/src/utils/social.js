@@ -113,3 +113,15 @@ export async function getPublicProfile(userId) {
   }
   return await res.json();
 }
+
+export async function getFriendsLeaderboard(userId) {
+  try {
+    const res = await fetch(`${API_URL}/leaderboard/users/${userId}/friends`, {
+      headers: authHeaders(),
+    });
+    if (!res.ok) return [];
+    return await res.json();
+  } catch {
+    return [];
+  }
+}